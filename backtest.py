@@ -1,68 +1,113 @@
+import hashlib
+
 import streamlit as st
-import yfinance as yf
 import pandas as pd
+import numpy as np
 
+import logic_kernels as kernels
+from config import BACKTEST_PROCESSES, PRESET_CODES, WATCHLIST
+from logic_backtest import POSITIONS, SWEEP_HIGHS, SWEEP_LOWS, band_position, equity_curve, threshold_sweep
+from logic_batch import RESULT_COLUMNS, batch_backtest
+from logic_cache import SWRCache
+from logic_data import get_backtest_arrays, get_histories, get_indicator_frame
+from logic_engine import STOP_LOSS, TAKE_PROFIT, run_events
+from logic_montecarlo import BAND_PERCENTILES, monte_carlo
+from logic_portfolio import portfolio_stats, run_portfolio
+from logic_rules import RULE_HELP, RuleError, compile_rules
+from logic_walkforward import WINDOW_COLUMNS, parameter_stability, walk_forward
 
-@st.cache_data(ttl=1800)
-def fetch_price_series(symbol: str, period: str):
-    df = yf.download(symbol, period=period, progress=False)
-    return df[["Close"]].dropna()
 
+# 蒙特卡洛模拟结果：(收益率序列摘要, 路径数, 块长, 方法) -> 模拟结果，与行情缓存共用内存预算
+_monte_carlo_cache = SWRCache("monte_carlo", float("inf"), swr=False)
 
-def rsi_signal_strategy(df: pd.DataFrame, low=30, high=70):
-    """基于RSI的简单多空策略：RSI<low 持有多头，RSI>high 空仓。"""
-    close = df["Close"]
-    delta = close.diff()
-    gain = delta.where(delta > 0, 0).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
+
+# 内置策略的规则表达式（语法见 logic_rules），阈值在运行时填入
+RSI_STRATEGY_RULE = "RSI(14) < {low} and not RSI(14) > {high}"
+COMBO_BUY_RULE = "RSI(14) < {low} and MACD > MACD_SIGNAL"
+COMBO_SELL_RULE = "RSI(14) > {high} or MACD < MACD_SIGNAL"
+CUSTOM_RULE_EXAMPLE = "RSI(14) < 30 and MACD > MACD_SIGNAL"
+
+
+def rule_strategy(df: pd.DataFrame, rule: str, columns=None):
+    """规则策略：rule 成立时持有多头，否则空仓；columns 为额外写入结果的 {列名: 数值表达式}。"""
+    plan = compile_rules({**(columns or {}), "Position": rule})
+    if plan.kinds[plan.outputs["Position"]] != "bool":
+        raise RuleError("建仓规则必须是条件表达式（需要比较，如 RSI(14) < 30）")
+    values = plan.evaluate(df)
     df = df.copy()
-    df["RSI"] = rsi
-    df["Position"] = 0
-    df.loc[df["RSI"] < low, "Position"] = 1
-    df.loc[df["RSI"] > high, "Position"] = 0
-    df["Position"] = df["Position"].ffill().fillna(0)
+    for name in columns or {}:
+        df[name] = values[name]
+    df["Position"] = values["Position"].astype(np.int64)
     return df
 
 
+def rsi_signal_strategy(df: pd.DataFrame, low=30, high=70):
+    """基于RSI的简单多空策略：RSI<low 持有多头，RSI>high 空仓。"""
+    # RSI<low 建仓，RSI>high 清仓，其余为空仓
+    return rule_strategy(df, RSI_STRATEGY_RULE.format(low=low, high=high), {"RSI": "RSI(14)"})
+
+
 def rsi_macd_combo_strategy(df: pd.DataFrame, rsi_low=30, rsi_high=70):
     """RSI + MACD 联合策略：
     - 当 RSI < rsi_low 且 MACD > Signal 时持有多头
     - 当 RSI > rsi_high 或 MACD < Signal 时清仓
     """
+    # 开仓：RSI 超卖 + MACD 在 Signal 之上；平仓：RSI 超买 或 MACD 跌破 Signal（平仓优先）
+    buy = COMBO_BUY_RULE.format(low=rsi_low)
+    sell = COMBO_SELL_RULE.format(high=rsi_high)
+    return rule_strategy(df, f"({buy}) and not ({sell})",
+                         {"RSI": "RSI(14)", "MACD": "MACD", "MACD_Signal": "MACD_SIGNAL"})
+
+
+def rsi_band_strategy(df: pd.DataFrame, low=30, high=70):
+    """RSI 低买高卖策略：RSI<low 建仓并一直持有，直到 RSI>high 才清仓。"""
     df = df.copy()
-    close = df["Close"]
-
-    # 计算 RSI
-    delta = close.diff()
-    gain = delta.where(delta > 0, 0).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
+    rsi = kernels.rsi(df["Close"].to_numpy(), 14)
     df["RSI"] = rsi
+    df["Position"] = band_position(rsi, low, high).astype(np.int64)
+    return df
 
-    # 计算 MACD (12, 26, 9)
-    ema12 = close.ewm(span=12, adjust=False).mean()
-    ema26 = close.ewm(span=26, adjust=False).mean()
-    macd = ema12 - ema26
-    signal = macd.ewm(span=9, adjust=False).mean()
-    df["MACD"] = macd
-    df["MACD_Signal"] = signal
 
-    # 建仓/平仓规则
-    df["Position"] = 0
+# 使用买入/卖出阈值的内置策略：名称 -> (策略函数, 参数扫描中的策略代号)
+THRESHOLD_STRATEGIES = {
+    "仅RSI信号": (rsi_signal_strategy, "rsi"),
+    "RSI + MACD 联合信号": (rsi_macd_combo_strategy, "combo"),
+    "RSI 低买高卖": (rsi_band_strategy, "band"),
+}
 
-    # 开仓：RSI 超卖 + MACD 在 Signal 之上
-    buy_cond = (df["RSI"] < rsi_low) & (df["MACD"] > df["MACD_Signal"])
-    # 平仓：RSI 超买 或 MACD 跌破 Signal
-    sell_cond = (df["RSI"] > rsi_high) | (df["MACD"] < df["MACD_Signal"])
+# 参数扫描热力图可选的指标：名称 -> (threshold_sweep 结果中的键, 是否按百分比显示)
+SWEEP_METRIC_LABELS = {
+    "最终收益率": ("final", True),
+    "夏普比率": ("sharpe", False),
+    "最大回撤": ("max_dd", True),
+}
 
-    df.loc[buy_cond, "Position"] = 1
-    df.loc[sell_cond, "Position"] = 0
 
-    df["Position"] = df["Position"].ffill().fillna(0)
-    return df
+# 滚动优化的窗口方式：名称 -> logic_walkforward 中的模式
+WALK_FORWARD_MODE_LABELS = {
+    "滚动窗口": "rolling",
+    "扩展窗口": "expanding",
+}
+
+
+# 蒙特卡洛的重抽样方法：名称 -> logic_montecarlo 中的方法
+BOOTSTRAP_METHOD_LABELS = {
+    "平稳自助法": "stationary",
+    "固定块自助法": "block",
+}
+
+
+# 组合回测的加权方式与调仓周期：名称 -> logic_portfolio 中的取值
+PORTFOLIO_WEIGHTING_LABELS = {
+    "等权": "equal",
+    "波动率倒数": "inverse_vol",
+}
+REBALANCE_LABELS = {
+    "每日": "D",
+    "每周": "W",
+    "每月": "M",
+    "每季": "Q",
+}
 
 
 def compute_backtest(df: pd.DataFrame):
@@ -76,8 +121,112 @@ def compute_backtest(df: pd.DataFrame):
     return df
 
 
+def threshold_positions(arrays, sweep_key: str, low, high):
+    """用缓存的指标数组（见 logic_data.get_backtest_arrays）计算内置阈值策略的持仓，结果与对应的策略函数相同。"""
+    position = POSITIONS[sweep_key](arrays, low, high).astype(np.int64)
+    return pd.DataFrame({"Close": arrays["Close"], "RSI": arrays["RSI"], "Position": position},
+                        index=arrays["Index"])
+
+
+def compute_cached_backtest(df: pd.DataFrame, arrays):
+    """与 compute_backtest 结果相同，但收益率与买入持有净值直接取自缓存数组，只计算策略净值。"""
+    df = df.copy()
+    df["Return"] = arrays["Return"]
+    df["StrategyReturn"], df["Equity_Strategy"] = equity_curve(arrays["Return"], df["Position"].to_numpy())
+    df["Equity_BuyHold"] = arrays["Equity_BuyHold"]
+    return df
+
+
+def compute_event_backtest(df: pd.DataFrame, fee_bps=0.0, slippage=0.0, size=1.0, stop_loss=None, take_profit=None):
+    """
+    事件驱动回测（含手续费、滑点、仓位比例、止损止盈，见 logic_engine.run_events），
+    输出列与 compute_backtest 相同，另有 Trade（成交方向）与 Cost（交易成本）；成本为 0 时两者结果一致。
+    """
+    result = run_events(df["Close"].to_numpy(), df["Position"].to_numpy(), fee_bps=fee_bps, slippage=slippage,
+                        size=size, stop_loss=stop_loss, take_profit=take_profit)
+    df = df.copy()
+    df["Return"] = result["returns"]
+    df["Position"] = result["position"].astype(np.int64)
+    df["Trade"] = result["trade"]
+    df["Cost"] = result["cost"]
+    equity = pd.Series(result["equity"], index=df.index)
+    df["StrategyReturn"] = equity.pct_change()
+    df["Equity_BuyHold"] = (1 + df["Return"]).cumprod()
+    # 与 compute_backtest 一致：首行没有收益率，净值也为空
+    df["Equity_Strategy"] = equity.where(df["Return"].notna())
+    return df
+
+
+def show_trading_costs():
+    """交易成本与风控参数，返回传给 compute_event_backtest 的参数；全部为默认值时返回 None（使用向量化回测）"""
+    with st.expander("交易成本与风控（事件驱动回测）"):
+        col_fee, col_slip, col_size = st.columns(3)
+        with col_fee:
+            fee_bps = st.number_input("手续费（基点，单边）", min_value=0.0, max_value=100.0, value=0.0, step=1.0,
+                                      key="backtest_fee_bps")
+        with col_slip:
+            slippage = st.number_input("滑点（每股，价格单位）", min_value=0.0, value=0.0, step=0.01,
+                                       key="backtest_slippage")
+        with col_size:
+            size = st.slider("建仓比例（%）", 10, 100, 100, step=5, key="backtest_size") / 100
+        col_sl, col_tp = st.columns(2)
+        with col_sl:
+            stop_loss = st.number_input("止损（%，0 为不设）", min_value=0.0, max_value=90.0, value=0.0, step=1.0,
+                                        key="backtest_stop_loss") / 100
+        with col_tp:
+            take_profit = st.number_input("止盈（%，0 为不设）", min_value=0.0, value=0.0, step=1.0,
+                                          key="backtest_take_profit") / 100
+    costs = dict(fee_bps=fee_bps, slippage=slippage, size=size, stop_loss=stop_loss or None,
+                 take_profit=take_profit or None)
+    if costs == dict(fee_bps=0.0, slippage=0.0, size=1.0, stop_loss=None, take_profit=None):
+        return None
+    return costs
+
+
+def show_threshold_sweep(arrays, symbol: str, sweep_key: str):
+    """参数扫描热力图：一次算出全部阈值组合的指标，返回选中格子（默认最优）的 (买入阈值, 卖出阈值)。"""
+    metric_label = st.radio("热力图指标", options=list(SWEEP_METRIC_LABELS), horizontal=True,
+                            key="backtest_sweep_metric")
+    metric, as_percent = SWEEP_METRIC_LABELS[metric_label]
+    grid = threshold_sweep(arrays["Close"], sweep_key, indicators=arrays)[metric]
+    z = grid * 100 if as_percent else grid
+
+    import plotly.graph_objects as go
+
+    fig = go.Figure(
+        go.Heatmap(
+            z=z,
+            x=SWEEP_HIGHS,
+            y=SWEEP_LOWS,
+            colorscale="RdYlGn",
+            colorbar=dict(title=metric_label + ("(%)" if as_percent else "")),
+            hovertemplate="买入阈值 %{y}<br>卖出阈值 %{x}<br>" + metric_label + " %{z:.2f}<extra></extra>",
+        )
+    )
+    fig.update_layout(
+        title=f"{symbol} - RSI 阈值参数扫描（{metric_label}）",
+        xaxis_title="RSI 卖出阈值",
+        yaxis_title="RSI 买入阈值",
+        template="plotly_white",
+        height=500,
+    )
+    event = st.plotly_chart(fig, use_container_width=True, on_select="rerun",
+                            selection_mode="points", key="backtest_sweep_heatmap")
+    points = event.selection.points if event else []
+    if points:
+        return int(points[0]["y"]), int(points[0]["x"])
+
+    # 未点选时展示最优组合（所有指标都是越大越好，最大回撤为负数）
+    if np.isnan(grid).all():
+        return 30, 70
+    i, j = np.unravel_index(np.nanargmax(grid), grid.shape)
+    st.caption(f"点击热力图中的格子查看该组参数的净值曲线；当前显示{metric_label}最优的组合："
+               f"买入阈值 {SWEEP_LOWS[i]}、卖出阈值 {SWEEP_HIGHS[j]}。")
+    return int(SWEEP_LOWS[i]), int(SWEEP_HIGHS[j])
+
+
 def show_backtest():
-    """展示策略回测结果（支持 RSI / RSI+MACD 联合策略）。"""
+    """展示策略回测结果（支持 RSI / RSI+MACD 联合 / RSI 低买高卖 / 自定义规则策略，以及阈值参数扫描、蒙特卡洛模拟、滚动优化、组合回测与批量回测）。"""
     st.subheader("📐 策略回测实验室")
     st.caption("对当前选择的股票进行简单规则策略回测，对比买入持有表现。")
 
@@ -95,24 +244,54 @@ def show_backtest():
 
     strategy_type = st.radio(
         "选择策略",
-        options=["仅RSI信号", "RSI + MACD 联合信号"],
+        options=[*THRESHOLD_STRATEGIES, "自定义规则"],
         horizontal=True,
         key="backtest_strategy_type",
     )
 
-    df = fetch_price_series(symbol, period)
+    # 收盘价与指标取自同一份K线，避免两次读取之间缓存刷新导致行数对不上
+    arrays = frame = None
+    if strategy_type == "自定义规则":
+        frame = get_indicator_frame(symbol, period)
+        df = frame[["Close"]].dropna() if not frame.empty else pd.DataFrame()
+    else:
+        arrays = get_backtest_arrays(symbol, period)
+        df = pd.DataFrame({"Close": arrays["Close"]}, index=arrays["Index"]) if arrays is not None else pd.DataFrame()
     if df.empty or len(df) < 30:
         st.warning("该区间数据不足，无法回测。")
         return
 
-    low = st.slider("RSI 买入阈值（低于该值建仓）", 10, 40, 30, step=1)
-    high = st.slider("RSI 卖出阈值（高于该值清仓）", 60, 90, 70, step=1)
-
-    if strategy_type == "仅RSI信号":
-        df_with_pos = rsi_signal_strategy(df, low=low, high=high)
-    else:  # RSI + MACD 联合信号
-        df_with_pos = rsi_macd_combo_strategy(df, rsi_low=low, rsi_high=high)
-    df_bt = compute_backtest(df_with_pos)
+    if strategy_type == "自定义规则":
+        rule = st.text_input("建仓规则（条件成立时持有多头，否则空仓）", value=CUSTOM_RULE_EXAMPLE,
+                             key="backtest_custom_rule", help=RULE_HELP)
+        try:
+            # 默认参数的指标直接读取共享的指标缓存（与主页面相同），其余按规则即时计算
+            df_with_pos = rule_strategy(frame.loc[df.index], rule)
+            batch_spec = ("rule", {"rule": rule})
+        except RuleError as e:
+            st.error(f"规则无效：{e}")
+            return
+    else:
+        _, sweep_key = THRESHOLD_STRATEGIES[strategy_type]
+        # 指标数组按 (代码, 周期) 缓存，拖动阈值滑块时只重算持仓与策略净值
+        if st.toggle("参数扫描（买入阈值 10–40 × 卖出阈值 60–90，共 961 组）", key="backtest_sweep"):
+            low, high = show_threshold_sweep(arrays, symbol, sweep_key)
+        else:
+            low = st.slider("RSI 买入阈值（低于该值建仓）", 10, 40, 30, step=1)
+            high = st.slider("RSI 卖出阈值（高于该值清仓）", 60, 90, 70, step=1)
+        df_with_pos = threshold_positions(arrays, sweep_key, low, high)
+        batch_spec = (sweep_key, {"low": low, "high": high})
+    costs = show_trading_costs()
+    if costs is not None:
+        try:
+            df_bt = compute_event_backtest(df_with_pos, **costs)
+        except ValueError as e:
+            st.error(f"交易成本参数无效：{e}")
+            return
+    elif arrays is not None:
+        df_bt = compute_cached_backtest(df_with_pos, arrays)
+    else:
+        df_bt = compute_backtest(df_with_pos)
 
     # 统计指标
     equity_bh = df_bt["Equity_BuyHold"]
@@ -125,6 +304,10 @@ def show_backtest():
         st.metric("买入持有最终收益率", f"{final_bh * 100:.2f}%")
     with col_m2:
         st.metric("策略最终收益率", f"{final_st * 100:.2f}%")
+    if costs is not None:
+        trades = df_bt["Trade"]
+        st.caption(f"成交 {int((trades != 0).sum())} 次（止损 {int((trades == STOP_LOSS).sum())} 次、"
+                   f"止盈 {int((trades == TAKE_PROFIT).sum())} 次），交易成本合计 {df_bt['Cost'].sum() * 100:.2f}%（占初始资金）。")
 
     import plotly.graph_objects as go
 
@@ -155,4 +338,294 @@ def show_backtest():
     )
     st.plotly_chart(fig, use_container_width=True)
 
+    show_monte_carlo(df_bt, symbol)
+    if strategy_type in THRESHOLD_STRATEGIES:
+        show_walk_forward(df, symbol, strategy_type)
+    show_portfolio_backtest(period, strategy_type, *batch_spec)
+    show_batch_backtest(period, *batch_spec)
+
+
+def show_monte_carlo(df_bt: pd.DataFrame, symbol: str):
+    """蒙特卡洛模拟：对策略逐日收益率按块重抽样，展示净值分位数带与最终收益率、最大回撤的分布。"""
+    st.markdown("---")
+    st.subheader("🎲 蒙特卡洛模拟（收益不确定性）")
+    if not st.toggle("启用蒙特卡洛模拟", key="backtest_monte_carlo"):
+        st.caption("上方只是一条历史路径；蒙特卡洛模拟把策略的逐日收益率按块重新排列，估计收益与回撤的可能范围。")
+        return
+
+    col_method, col_block, col_paths = st.columns(3)
+    with col_method:
+        method_label = st.radio("重抽样方法", options=list(BOOTSTRAP_METHOD_LABELS), horizontal=True,
+                                key="monte_carlo_method")
+    with col_block:
+        block = st.slider("平均块长（交易日）", 1, 60, 20, key="monte_carlo_block")
+    with col_paths:
+        paths = st.select_slider("路径数", options=[1000, 5000, 10000], value=10000, key="monte_carlo_paths")
+
+    use_pool = st.toggle(f"多进程模拟（{BACKTEST_PROCESSES} 个进程）", value=False, key="monte_carlo_pool",
+                         help="默认在当前进程内模拟；路径很多、序列很长时可改用共享进程池。单进程与多进程结果相同。")
+
+    returns = df_bt["StrategyReturn"].to_numpy(dtype="float64")[1:]
+    method = BOOTSTRAP_METHOD_LABELS[method_label]
+    # 结果只取决于收益率序列与模拟参数（种子固定），页面重跑时直接复用
+    key = (hashlib.sha1(returns.tobytes()).hexdigest(), paths, block, method)
+    with st.spinner(f"正在模拟 {paths} 条路径..."):
+        result = _monte_carlo_cache.get(key, lambda: monte_carlo(
+            returns, paths, block, method, processes=BACKTEST_PROCESSES if use_pool else 1))
+    final, max_dd = result["final"], result["max_dd"]
+
+    col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+    with col_m1:
+        st.metric("最终收益率中位数", f"{np.median(final) * 100:.2f}%")
+    with col_m2:
+        st.metric("最终收益率 5% 分位", f"{np.percentile(final, 5) * 100:.2f}%")
+    with col_m3:
+        st.metric("亏损概率", f"{(final < 0).mean() * 100:.1f}%")
+    with col_m4:
+        st.metric("最大回撤中位数", f"{np.median(max_dd) * 100:.2f}%")
+
+    import plotly.graph_objects as go
+
+    dates = df_bt.index[1:][result["steps"]]
+    bands = dict(zip(BAND_PERCENTILES, result["bands"]))
+    fig = go.Figure()
+    for (low, high), opacity in (((5, 95), 0.15), ((25, 75), 0.3)):
+        fig.add_trace(go.Scatter(x=dates, y=bands[high], line=dict(width=0), showlegend=False, hoverinfo="skip"))
+        fig.add_trace(go.Scatter(x=dates, y=bands[low], line=dict(width=0), fill="tonexty",
+                                 fillcolor=f"rgba(34, 197, 94, {opacity})", name=f"{low}%–{high}% 分位"))
+    fig.add_trace(go.Scatter(x=dates, y=bands[50], name="中位数", line=dict(color="#22c55e", width=2, dash="dash")))
+    fig.add_trace(go.Scatter(x=df_bt.index, y=df_bt["Equity_Strategy"], name="历史策略净值",
+                             line=dict(color="#1f77b4", width=2)))
+    fig.update_layout(
+        title=f"{symbol} - 策略净值的蒙特卡洛分位数带（{paths} 条路径，{method_label}）",
+        yaxis_title="净值 (初始=1)",
+        xaxis_title="日期",
+        template="plotly_white",
+        hovermode="x unified",
+        height=500,
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    actual = {"final": df_bt["Equity_Strategy"].iloc[-1] - 1,
+              "max_dd": (df_bt["Equity_Strategy"] / df_bt["Equity_Strategy"].cummax() - 1).min()}
+    col_h1, col_h2 = st.columns(2)
+    for col, key, values, title in ((col_h1, "final", final, "最终收益率分布"),
+                                    (col_h2, "max_dd", max_dd, "最大回撤分布")):
+        hist = go.Figure(go.Histogram(x=values * 100, nbinsx=60, marker_color="#22c55e", name=title))
+        hist.add_vline(x=actual[key] * 100, line=dict(color="#1f77b4", dash="dash"), annotation_text="历史")
+        hist.update_layout(title=title, xaxis_title="%", yaxis_title="路径数", template="plotly_white",
+                           height=350, showlegend=False)
+        with col:
+            st.plotly_chart(hist, use_container_width=True)
+
+
+def show_walk_forward(df: pd.DataFrame, symbol: str, strategy_type: str):
+    """滚动优化：每个窗口在训练期选出最优阈值，在随后的测试期样本外回测，拼接各测试期得到样本外净值。"""
+    st.markdown("---")
+    st.subheader("🔁 滚动优化（样本外检验）")
+    if not st.toggle("启用滚动优化（walk-forward）", key="backtest_walk_forward"):
+        st.caption("上方结果使用同一段数据选参数并回测，容易过拟合；滚动优化只用过去的数据选参数，检验参数在之后的表现。")
+        return
+
+    col_mode, col_metric = st.columns(2)
+    with col_mode:
+        mode_label = st.radio("窗口方式", options=list(WALK_FORWARD_MODE_LABELS), horizontal=True,
+                              key="walk_forward_mode")
+    with col_metric:
+        metric_label = st.radio("优化目标", options=list(SWEEP_METRIC_LABELS), index=1, horizontal=True,
+                                key="walk_forward_metric")
+    col_train, col_test = st.columns(2)
+    with col_train:
+        train = st.select_slider("训练期（交易日）", options=[63, 126, 252, 504, 756], value=252,
+                                 key="walk_forward_train")
+    with col_test:
+        test = st.select_slider("测试期（交易日）", options=[21, 42, 63, 126, 252], value=63,
+                                key="walk_forward_test")
+    if len(df) <= train:
+        st.warning(f"当前区间只有 {len(df)} 根K线，不足一个训练期，请选择更长的回测区间或缩短训练期。")
+        return
+
+    _, sweep_key = THRESHOLD_STRATEGIES[strategy_type]
+    with st.spinner("滚动优化中..."):
+        table, equity = walk_forward(df["Close"], sweep_key, train, test, WALK_FORWARD_MODE_LABELS[mode_label],
+                                     SWEEP_METRIC_LABELS[metric_label][0])
+
+    col_m1, col_m2, col_m3 = st.columns(3)
+    with col_m1:
+        st.metric("样本外买入持有收益率", f"{(equity['Equity_BuyHold'].iloc[-1] - 1) * 100:.2f}%")
+    with col_m2:
+        st.metric("样本外策略收益率", f"{(equity['Equity_Strategy'].iloc[-1] - 1) * 100:.2f}%")
+    with col_m3:
+        st.metric("窗口数", len(table))
+
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.65, 0.35], vertical_spacing=0.08,
+                        subplot_titles=("样本外净值（各测试期拼接）", "各窗口选出的阈值"))
+    fig.add_trace(go.Scatter(x=equity.index, y=equity["Equity_BuyHold"], name="买入持有",
+                             line=dict(color="#1f77b4", width=2)), row=1, col=1)
+    fig.add_trace(go.Scatter(x=equity.index, y=equity["Equity_Strategy"], name="样本外策略",
+                             line=dict(color="#22c55e", width=2)), row=1, col=1)
+    for key, color in (("low", "#f59e0b"), ("high", "#ef4444")):
+        fig.add_trace(go.Scatter(x=table["test_start"], y=table[key], name=WINDOW_COLUMNS[key],
+                                 mode="lines+markers", line=dict(color=color, shape="hv")), row=2, col=1)
+    fig.update_layout(
+        title=f"{symbol} - 滚动优化（{mode_label}，训练 {train} / 测试 {test} 个交易日）",
+        template="plotly_white",
+        hovermode="x unified",
+        height=650,
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    stability = parameter_stability(table)
+    st.caption(f"参数稳定性：买入阈值标准差 {stability['low_std']:.1f}，卖出阈值标准差 {stability['high_std']:.1f}，"
+               f"与上一窗口参数相同的比例 {stability['unchanged'] * 100:.0f}%。")
+    shown = table.copy()
+    for key in ("train_start", "test_start", "test_end"):
+        shown[key] = table[key].dt.date
+    shown[["final", "buy_hold", "max_dd"]] = (table[["final", "buy_hold", "max_dd"]] * 100).round(2)
+    shown[["train_score", "sharpe"]] = table[["train_score", "sharpe"]].round(3)
+    shown = shown.rename(columns={key: label + ("(%)" if key in ("final", "buy_hold", "max_dd") else "")
+                                  for key, label in WINDOW_COLUMNS.items()})
+    st.dataframe(shown, use_container_width=True, hide_index=True)
+
+
+def show_portfolio_backtest(period: str, strategy_type: str, strategy: str, params: dict):
+    """组合回测：对一篮子股票应用同一策略，按等权或波动率倒数分配权重并定期调仓，展示组合净值、换手与持仓权重。"""
+    st.markdown("---")
+    st.subheader("🧺 组合回测")
+    if not st.toggle("启用组合回测", key="backtest_portfolio"):
+        st.caption("对一篮子股票（默认自选股）应用同一策略，按等权或波动率倒数分配资金并定期调仓。")
+        return
+
+    codes = list(dict.fromkeys([*WATCHLIST, *PRESET_CODES]))
+    symbols = st.multiselect("组合成分", options=codes, default=WATCHLIST, key="portfolio_symbols")
+    strategy_options = ["始终持有"] if strategy == "rule" else [f"上方策略（{strategy_type}）", "始终持有"]
+    col_rule, col_weight, col_freq, col_fee = st.columns(4)
+    with col_rule:
+        rule_label = st.radio("成分股持仓", options=strategy_options, key="portfolio_strategy",
+                              help="自定义规则暂不支持组合回测，只能始终持有。" if strategy == "rule" else None)
+    with col_weight:
+        weight_label = st.radio("加权方式", options=list(PORTFOLIO_WEIGHTING_LABELS), key="portfolio_weighting")
+    with col_freq:
+        freq_label = st.selectbox("调仓周期", options=list(REBALANCE_LABELS), index=2, key="portfolio_freq")
+    with col_fee:
+        fee_bps = st.number_input("手续费（基点）", min_value=0.0, max_value=100.0, value=0.0, step=1.0,
+                                  key="portfolio_fee_bps")
+    if not symbols:
+        st.info("请至少选择一只股票。")
+        return
+
+    closes, missing = load_close_matrix(symbols, period)
+    if missing:
+        st.caption(f"⚠️ {len(missing)} 只股票暂无数据，已跳过：{'、'.join(missing)}")
+    if closes.shape[0] < 30:
+        st.warning("该区间数据不足，无法回测。")
+        return
+
+    key = "hold" if rule_label == "始终持有" else strategy
+    frame, weights = run_portfolio(closes, key, params.get("low", 30), params.get("high", 70),
+                                   PORTFOLIO_WEIGHTING_LABELS[weight_label], REBALANCE_LABELS[freq_label], fee_bps)
+    # 等权始终持有作为基准
+    baseline, _ = run_portfolio(closes, "hold", freq=REBALANCE_LABELS[freq_label])
+    stats = portfolio_stats(frame)
+
+    col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+    with col_m1:
+        st.metric("组合最终收益率", f"{stats['final'] * 100:.2f}%",
+                  delta=f"{(stats['final'] - (baseline['Equity'].iloc[-1] - 1)) * 100:.2f}% vs 等权持有")
+    with col_m2:
+        st.metric("年化收益率 / 波动率", f"{stats['annual_return'] * 100:.2f}% / {stats['volatility'] * 100:.2f}%")
+    with col_m3:
+        st.metric("夏普比率 / 最大回撤", f"{stats['sharpe']:.2f} / {stats['max_dd'] * 100:.2f}%")
+    with col_m4:
+        st.metric("年化换手率", f"{stats['turnover'] * 100:.0f}%")
+
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.6, 0.4], vertical_spacing=0.08,
+                        subplot_titles=("组合净值", "实际持仓权重"))
+    fig.add_trace(go.Scatter(x=baseline.index, y=baseline["Equity"], name="等权始终持有",
+                             line=dict(color="#1f77b4", width=2)), row=1, col=1)
+    fig.add_trace(go.Scatter(x=frame.index, y=frame["Equity"], name="组合净值",
+                             line=dict(color="#22c55e", width=2)), row=1, col=1)
+    for symbol in weights.columns:
+        fig.add_trace(go.Scatter(x=weights.index, y=weights[symbol], name=symbol, stackgroup="weights",
+                                 line=dict(width=0.5)), row=2, col=1)
+    fig.update_yaxes(tickformat=".0%", row=2, col=1)
+    fig.update_layout(
+        title=f"组合回测（{len(weights.columns)} 只，{weight_label}，{freq_label}调仓）",
+        template="plotly_white",
+        hovermode="x unified",
+        height=700,
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def load_close_matrix(symbols, period):
+    """多只股票的收盘价宽表（日期×代码，各市场休市日为 NaN），来自共享K线缓存；返回 (宽表, 无数据的代码)"""
+    histories = get_histories(symbols, period)
+    closes = {symbol: bars["Close"] for symbol, bars in histories.items() if not bars.empty}
+    missing = [symbol for symbol in histories if symbol not in closes]
+    return pd.DataFrame(closes).sort_index(), missing
+
+
+_PERCENT_RESULTS = ("final", "buy_hold", "excess", "max_dd", "exposure")
+
+
+def _format_results(frame: pd.DataFrame):
+    """结果表转为展示用的中文列名，收益类指标换算为百分比"""
+    shown = frame.copy()
+    shown[list(_PERCENT_RESULTS)] = (frame[list(_PERCENT_RESULTS)] * 100).round(2)
+    shown["sharpe"] = frame["sharpe"].round(2)
+    return shown.rename(columns={key: label + ("(%)" if key in _PERCENT_RESULTS else "")
+                                 for key, label in RESULT_COLUMNS.items()})
+
+
+def show_batch_backtest(period: str, strategy: str, params: dict):
+    """股票池批量回测：用当前策略与参数回测 PRESET_STOCKS（或自选股）中的全部股票，结果逐只刷新。"""
+    st.markdown("---")
+    st.subheader("📊 股票池批量回测")
+    st.caption(f"使用上方选择的策略与参数，在多个工作进程中并行回测（{BACKTEST_PROCESSES} 个进程），"
+               "K线优先读取缓存与本地K线库。")
+
+    universe = st.radio("股票池", options=["预设股票", "自选股"], horizontal=True, key="batch_universe")
+    sort_label = st.selectbox("排序指标", options=list(RESULT_COLUMNS.values()), key="batch_sort_by")
+    sort_by = {label: key for key, label in RESULT_COLUMNS.items()}[sort_label]
+
+    if st.button("开始批量回测", key="batch_run"):
+        if universe == "预设股票":
+            symbols = list(PRESET_CODES)
+        else:
+            symbols = list(WATCHLIST)
+        with st.spinner(f"正在读取 {len(symbols)} 只股票的K线..."):
+            closes, missing = load_close_matrix(symbols, period)
+        if missing:
+            st.caption(f"⚠️ {len(missing)} 只股票暂无数据，已跳过：{'、'.join(missing)}")
+
+        progress = st.progress(0.0, text="回测中...")
+        table = st.empty()
+        total = max(closes.shape[1], 1)
+
+        def _show_partial(frame):
+            progress.progress(len(frame) / total, text=f"回测中：已完成 {len(frame)}/{total}")
+            table.dataframe(_format_results(frame), use_container_width=True)
+
+        try:
+            results = batch_backtest(closes, strategy, params, sort_by=sort_by, on_result=_show_partial)
+        except RuleError as e:
+            # 批量回测只读取收盘价，规则中用到开盘价/最高价等时无法计算
+            st.error(f"规则无法用于批量回测：{e}")
+            return
+        finally:
+            progress.empty()
+            table.empty()
+        # 保存原始结果，切换排序指标时不必重新回测
+        st.session_state.batch_backtest_results = results
 
+    results = st.session_state.get("batch_backtest_results")
+    if results is not None and not results.empty:
+        ordered = results.sort_values(sort_by, ascending=False, na_position="last", kind="mergesort")
+        st.dataframe(_format_results(ordered), use_container_width=True)
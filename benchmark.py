@@ -0,0 +1,244 @@
+"""
+离线性能基准（不访问网络，使用合成价格序列）。
+
+    python benchmark.py kernels            # 指标计算：pandas 链式写法 vs logic_kernels
+    python benchmark.py kernels --sizes 10000 100000
+    python benchmark.py matrix             # 多只股票：逐只计算 vs 日期×代码矩阵一次计算，以及全池当前信号
+    python benchmark.py matrix --sizes 2520 --symbols 50 500
+    python benchmark.py sweep              # RSI 阈值扫描 961 组：逐组回测 vs 广播一次计算
+    python benchmark.py batch --symbols 100 --processes 4   # 股票池批量回测：单进程 vs 进程池
+    python benchmark.py engine             # 回测：向量化 compute_backtest vs 事件驱动（含成本）
+    python benchmark.py montecarlo         # 自助法蒙特卡洛 1 万条路径：平稳 / 固定块，单进程 vs 进程池
+    python benchmark.py portfolio --symbols 10 100   # 组合回测（波动率倒数加权、每周调仓）：逐日循环 vs 向量化
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import logic_kernels as kernels
+from config import BACKTEST_PROCESSES
+from logic_calc import calc_indicators, calc_indicator_matrix
+from logic_signal import universe_signals
+from logic_backtest import SWEEP_HIGHS, SWEEP_LOWS, threshold_sweep
+from logic_batch import batch_backtest
+from logic_montecarlo import monte_carlo
+from logic_portfolio import aligned_returns, portfolio_backtest, rebalance_days, run_portfolio, target_weights
+from backtest import compute_backtest, compute_event_backtest, rsi_signal_strategy
+
+
+def _best_of(fn, repeat=5):
+    """多次运行取最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _synthetic_close(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0.0, 0.01, n)))
+
+
+# ========== 对照组：改用 logic_kernels 之前的 pandas 实现 ==========
+def _pandas_sma(close):
+    return close.rolling(window=50).mean()
+
+
+def _pandas_rsi(close, period=14):
+    delta = close.diff().dropna()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    rsi = 100 - (100 / (1 + gain / loss))
+    df = pd.DataFrame({'RSI': rsi}, index=close.index)
+    df['RSI_Signal'] = 0
+    df.loc[df['RSI'] < 30, 'RSI_Signal'] = 1
+    df.loc[df['RSI'] > 70, 'RSI_Signal'] = -1
+    return df
+
+
+def _pandas_ema(close, span=12):
+    return close.ewm(span=span, adjust=False).mean()
+
+
+def _pandas_macd(close):
+    dif = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    dea = dif.ewm(span=9, adjust=False).mean()
+    df = pd.DataFrame({'DIF': dif, 'DEA': dea, 'MACD_BAR': 2 * (dif - dea)})
+    df['MACD_Crossover'] = 0
+    df.loc[(df['DIF'].shift(1) < df['DEA'].shift(1)) & (df['DIF'] > df['DEA']), 'MACD_Crossover'] = 1
+    df.loc[(df['DIF'].shift(1) > df['DEA'].shift(1)) & (df['DIF'] < df['DEA']), 'MACD_Crossover'] = -1
+    return df
+
+
+def _pandas_all(df):
+    close = df['Close']
+    return _pandas_sma(close), _pandas_rsi(close), _pandas_macd(close)
+
+
+def _kernel_macd(close, bufs):
+    dif, dea, ema_long = bufs
+    kernels.ema(close, 12, out=dif)
+    dif -= kernels.ema(close, 26, out=ema_long)
+    kernels.ema(dif, 9, out=dea)
+    return kernels.crossover(dif, dea)
+
+
+def bench_kernels(args):
+    sizes = args.sizes
+    print(f"{'指标':<14}{'行数':>10}{'pandas(ms)':>14}{'kernels(ms)':>14}{'加速比':>10}")
+    for n in sizes:
+        close = _synthetic_close(n)
+        series = pd.Series(close, index=pd.date_range('2000-01-01', periods=n, freq='min'))
+        frame = series.to_frame('Close')
+        out = np.empty(n)
+        bufs = tuple(np.empty(n) for _ in range(3))
+        cases = (
+            ('SMA50', lambda: _pandas_sma(series), lambda: kernels.rolling_mean(close, 50, out=out)),
+            ('EMA12', lambda: _pandas_ema(series), lambda: kernels.ema(close, 12, out=out)),
+            ('RSI14', lambda: _pandas_rsi(series), lambda: kernels.rsi(close, 14, out=out)),
+            ('MACD', lambda: _pandas_macd(series), lambda: _kernel_macd(close, bufs)),
+            ('全部指标', lambda: _pandas_all(frame), lambda: calc_indicators(frame)),
+        )
+        for name, old, new in cases:
+            t_old, t_new = _best_of(old), _best_of(new)
+            print(f"{name:<14}{n:>10}{t_old:>14.2f}{t_new:>14.2f}{t_old / t_new:>9.1f}x")
+
+
+def _synthetic_closes(n, m, seed=0):
+    """n 个交易日 × m 只股票，上市日期错开，并随机留出约 3% 的休市空值"""
+    rng = np.random.default_rng(seed)
+    data = 100 * np.exp(np.cumsum(rng.normal(0.0, 0.01, (n, m)), axis=0))
+    data[rng.random((n, m)) < 0.03] = np.nan
+    data[np.arange(n)[:, None] < rng.integers(0, n // 2, m)] = np.nan
+    index = pd.bdate_range('2000-01-03', periods=n)
+    return pd.DataFrame(data, index=index, columns=[f'S{i:04d}' for i in range(m)])
+
+
+def _per_symbol(closes):
+    return {symbol: calc_indicators(closes[symbol].dropna().to_frame('Close')) for symbol in closes.columns}
+
+
+def bench_matrix(args):
+    print(f"{'行数':>8}{'股票数':>8}{'逐只(ms)':>14}{'矩阵(ms)':>14}{'加速比':>10}{'当前信号(ms)':>16}")
+    for n in args.sizes:
+        for m in args.symbols:
+            closes = _synthetic_closes(n, m)
+            t_old = _best_of(lambda: _per_symbol(closes), repeat=3)
+            t_new = _best_of(lambda: calc_indicator_matrix(closes), repeat=3)
+            t_signal = _best_of(lambda: universe_signals(closes))
+            print(f"{n:>8}{m:>8}{t_old:>14.2f}{t_new:>14.2f}{t_old / t_new:>9.1f}x{t_signal:>16.2f}")
+
+
+def _sweep_loop(frame):
+    return [compute_backtest(rsi_signal_strategy(frame, low, high))["Equity_Strategy"].iloc[-1]
+            for low in SWEEP_LOWS for high in SWEEP_HIGHS]
+
+
+def bench_sweep(args):
+    print(f"{'行数':>8}{'逐组(ms)':>14}{'广播(ms)':>14}{'加速比':>10}")
+    for n in args.sizes:
+        close = _synthetic_close(n)
+        frame = pd.DataFrame({'Close': close}, index=pd.bdate_range('2000-01-03', periods=n))
+        t_old = _best_of(lambda: _sweep_loop(frame), repeat=1)
+        t_new = _best_of(lambda: threshold_sweep(close, 'rsi'))
+        print(f"{n:>8}{t_old:>14.2f}{t_new:>14.2f}{t_old / t_new:>9.1f}x")
+
+
+def bench_batch(args):
+    params = {'low': 30, 'high': 70}
+    print(f"{'行数':>8}{'股票数':>8}{'单进程(ms)':>14}{'进程池(ms)':>14}{'加速比':>10}")
+    for n in args.sizes:
+        for m in args.symbols:
+            closes = _synthetic_closes(n, m)
+            batch_backtest(closes, 'rsi', params, processes=args.processes)  # 先启动进程池
+            t_old = _best_of(lambda: batch_backtest(closes, 'rsi', params, processes=1), repeat=3)
+            t_new = _best_of(lambda: batch_backtest(closes, 'rsi', params, processes=args.processes), repeat=3)
+            print(f"{n:>8}{m:>8}{t_old:>14.2f}{t_new:>14.2f}{t_old / t_new:>9.1f}x")
+
+
+def bench_engine(args):
+    print(f"{'行数':>10}{'向量化(ms)':>14}{'事件驱动(ms)':>16}{'含成本(ms)':>14}{'净值最大差异':>16}")
+    costs = dict(fee_bps=5.0, slippage=0.01, size=0.8, stop_loss=0.05, take_profit=0.1)
+    for n in args.sizes:
+        frame = rsi_signal_strategy(pd.DataFrame({'Close': _synthetic_close(n)}), 35, 65)
+        t_vec = _best_of(lambda: compute_backtest(frame), repeat=3)
+        t_event = _best_of(lambda: compute_event_backtest(frame), repeat=1)
+        t_cost = _best_of(lambda: compute_event_backtest(frame, **costs), repeat=1)
+        diff = (compute_backtest(frame)['Equity_Strategy'] - compute_event_backtest(frame)['Equity_Strategy']).abs().max()
+        print(f"{n:>10}{t_vec:>14.2f}{t_event:>16.2f}{t_cost:>14.2f}{diff:>16.1e}")
+
+
+def bench_montecarlo(args):
+    paths = 10_000
+    print(f"{'行数':>8}{'方法':>12}{'单进程(ms)':>14}{'进程池(ms)':>14}")
+    for n in args.sizes:
+        close = _synthetic_close(n + 1)
+        returns = close[1:] / close[:-1] - 1.0
+        for method in ('stationary', 'block'):
+            t_one = _best_of(lambda: monte_carlo(returns, paths, 20, method), repeat=3)
+            monte_carlo(returns, paths, 20, method, processes=args.processes)  # 先启动进程池
+            t_pool = _best_of(lambda: monte_carlo(returns, paths, 20, method, processes=args.processes), repeat=3)
+            print(f"{n:>8}{method:>12}{t_one:>14.2f}{t_pool:>14.2f}")
+
+
+def _portfolio_loop(returns, weights, rebalance):
+    """逐日循环的组合回测（对照）：持仓按收益率漂移，调仓日调整为目标权重"""
+    holdings = np.zeros(returns.shape[1])
+    cash = 1.0
+    equity = np.empty(len(returns))
+    for t in range(len(returns)):
+        holdings = holdings * (1.0 + returns[t])
+        value = holdings.sum() + cash
+        if rebalance[t]:
+            holdings = weights[t] * value
+            cash = value - holdings.sum()
+        equity[t] = value
+    return equity
+
+
+def bench_portfolio(args):
+    print(f"{'行数':>8}{'股票数':>8}{'逐日循环(ms)':>16}{'向量化(ms)':>14}{'加速比':>10}{'含信号与权重(ms)':>20}")
+    for n in args.sizes:
+        for m in args.symbols:
+            closes = _synthetic_closes(n, m)
+            returns, listed = aligned_returns(closes)
+            weights = target_weights(listed.astype(np.float64))
+            rebalance = rebalance_days(closes.index, 'W')
+            t_old = _best_of(lambda: _portfolio_loop(returns, weights, rebalance), repeat=1)
+            t_new = _best_of(lambda: portfolio_backtest(returns, weights, rebalance), repeat=3)
+            t_all = _best_of(lambda: run_portfolio(closes, 'combo', weighting='inverse_vol', freq='W'), repeat=3)
+            print(f"{n:>8}{m:>8}{t_old:>16.2f}{t_new:>14.2f}{t_old / t_new:>9.1f}x{t_all:>20.2f}")
+
+
+SUITES = {
+    'kernels': bench_kernels,
+    'matrix': bench_matrix,
+    'sweep': bench_sweep,
+    'batch': bench_batch,
+    'engine': bench_engine,
+    'montecarlo': bench_montecarlo,
+    'portfolio': bench_portfolio,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线性能基准")
+    parser.add_argument('suite', choices=sorted(SUITES), help="要运行的基准")
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help="序列长度（kernels、engine 默认 1万/10万/100万，matrix、portfolio 默认 2520 个交易日，sweep、batch、montecarlo 默认 1260）")
+    parser.add_argument('--symbols', type=int, nargs='+', default=[50, 500],
+                        help="股票数（matrix、batch、portfolio）")
+    parser.add_argument('--processes', type=int, default=BACKTEST_PROCESSES,
+                        help="工作进程数（batch、montecarlo，默认与 BACKTEST_PROCESSES 相同）")
+    args = parser.parse_args()
+    if args.sizes is None:
+        args.sizes = {'matrix': [2520], 'portfolio': [2520], 'sweep': [1260], 'batch': [1260], 'montecarlo': [1260]}.get(args.suite, [10_000, 100_000, 1_000_000])
+    SUITES[args.suite](args)
+
+
+if __name__ == '__main__':
+    main()
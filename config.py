@@ -1,3 +1,5 @@
+import os
+
 # 页面配置（原始代码中的页面设置）
 PAGE_LAYOUT = 'wide'
 PAGE_TITLE = "Stock Dashboard"
@@ -10,7 +12,50 @@ DEFAULT_PERIOD_INDEX = 3  # 默认选1年
 SIDEBAR_INFO = '默认股票代码为AAPL，默认时间周期为1年'
 
 # 缓存配置（原始代码中的缓存时间）
-CACHE_TTL = 7200  # 2小时缓存
+CACHE_TTL = 7200  # 2小时缓存（K线，按 代码+周期）
+INFO_CACHE_TTL = 43200  # 12小时缓存（公司基本信息，变化很慢）
+NEWS_CACHE_TTL = 600  # 10分钟缓存（新闻）
+CACHE_MAX_BYTES = int(os.environ.get('DASHBOARD_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # 进程内缓存总内存上限，超出时淘汰最久未使用的条目
+
+# stale-while-revalidate：缓存过期后先返回旧数据并在后台刷新，不让用户等待上游
+SWR_ENABLED = True
+SWR_MAX_STALE = 86400  # 过期超过该秒数的数据不再直接返回，改为同步刷新
+SWR_WORKERS = 4  # 后台刷新线程数
+
+# 跨进程共享缓存（多个 Streamlit 进程共用的本地 SQLite 文件），为空时关闭
+SHARED_CACHE_PATH = os.environ.get('DASHBOARD_SHARED_CACHE', '')  # 例如 data_store/shared_cache.sqlite
+SHARED_CACHE_LEASE = 30  # 跨进程锁的租约秒数，持锁进程崩溃后到期自动释放
+
+# 后台预取（预热 PRESET_STOCKS 与 WATCHLIST 的K线和公司信息）
+PREFETCH_ENABLED = os.environ.get('DASHBOARD_PREFETCH', '1') != '0'
+PREFETCH_INTERVAL = 900  # 每轮预取间隔（秒），缓存会在下一轮之前过期的股票本轮刷新
+PREFETCH_PERIOD = '5y'  # 预取的K线周期（更短的周期直接切片）
+PREFETCH_TOKEN_RESERVE = 15  # 限流令牌低于该值时暂停预取，把额度留给交互请求
+ACCESS_HALF_LIFE = 3600  # 请求热度的半衰期（秒），用于预取排序
+
+# 上游限流配置（进程内所有会话共享同一个令牌桶）
+RATE_LIMIT_PER_SEC = 2.0  # 每秒补充的请求额度
+RATE_LIMIT_BURST = 30  # 允许的突发请求数
+RATE_LIMIT_MAX_WAIT = 0.5  # 额度不足时最多等待的秒数，超时直接回退到旧数据
+CIRCUIT_FAILURE_THRESHOLD = 3  # 连续被限流多少次后熔断
+CIRCUIT_COOLDOWN = 60  # 熔断持续秒数，期间只返回最近一次成功的数据
+
+# 行情数据源：'yfinance'（线上）或 'replay'（离线回放 fixture / 生成合成K线，用于压测与基准测试）
+DATA_PROVIDER = os.environ.get('DASHBOARD_DATA_PROVIDER', 'yfinance')
+REPLAY_FIXTURE_DIR = os.environ.get('DASHBOARD_REPLAY_DIR', '')  # Parquet/CSV 文件名为转义后的股票代码，如 %5EGSPC.parquet
+REPLAY_END_DATE = '2025-12-31'  # 合成K线的最后一个交易日（固定，保证结果可复现）
+REPLAY_MAX_BARS = 5000  # 合成K线的总根数（约20年）
+REPLAY_LATENCY = 0.0  # 模拟每次请求的网络延迟（秒）
+
+# 本地K线库（Parquet，按股票代码分文件，增量追加）
+BAR_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_store', 'bars')
+
+# 本地财报库（资产负债表/利润表/现金流量表，年度+季度）：按报告期失效，而不是按短 TTL
+FUNDAMENTALS_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_store', 'fundamentals')
+FUNDAMENTALS_FILING_LAG = 45  # 季度结束后预计披露季报的天数
+FUNDAMENTALS_ANNUAL_FILING_LAG = 90  # 只有年报时，年度结束后预计披露的天数
+FUNDAMENTALS_RECHECK = 21600  # 预计有新报表但上游尚未更新时，两次重新检查的最小间隔（秒）
+FUNDAMENTALS_WORKERS = 3  # 三张报表并发拉取
 
 # 绘图配置（原始代码中的图表参数）
 CHART_HEIGHT = 600
@@ -156,11 +201,20 @@ PRESET_STOCKS = [
     "SINA - Sina Corp (新浪)",
     "WB - Weibo Corp (微博)"
 ]
+# 预设股票的代码（"代码 - 名称" 中的代码部分），供预取、组合回测与批量回测使用
+PRESET_CODES = [opt.split(" - ")[0].strip().upper() for opt in PRESET_STOCKS]
 
 
 # ========== 自选股与基准指数配置 ==========
 # 自选股列表（仅代码），用于自选股观察列表模块
 WATCHLIST = ["AAPL", "MSFT", "NVDA", "TSLA", "BABA", "^GSPC", "^HSI"]
+WATCHLIST_MAX_WORKERS = 8  # 批量下载失败时逐只补齐的最大并发数
+WATCHLIST_CACHE_TTL = 1800  # 自选股数据缓存时间（秒）
+
+# ========== 批量回测配置 ==========
+# 股票池批量回测的工作进程数（默认等于 CPU 核数；为 1 时在当前进程内逐只计算）
+BACKTEST_PROCESSES = int(os.environ.get('DASHBOARD_BACKTEST_PROCESSES', os.cpu_count() or 1))
+BACKTEST_LOAD_WORKERS = 8  # 批量回测前并发读取K线（缓存/本地K线库优先）的线程数
 
 # 常用基准指数（代码 -> 名称）
 BENCHMARK_OPTIONS = {
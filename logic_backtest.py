@@ -0,0 +1,122 @@
+import numpy as np
+
+import logic_kernels as kernels
+from logic_calc import IndicatorPipeline
+
+
+TRADING_DAYS = 252  # 年化用的交易日数（与股票对比页一致）
+
+# 参数扫描的阈值网格（与回测页滑块的范围一致）：31 × 31 = 961 组
+SWEEP_LOWS = np.arange(10, 41)
+SWEEP_HIGHS = np.arange(60, 91)
+
+SWEEP_METRICS = ('final', 'sharpe', 'max_dd')
+
+
+def simple_returns(close):
+    """逐日收益率（首行为 NaN），与 Series.pct_change() 相同"""
+    close = kernels.as_float64(close)
+    out = np.empty_like(close)
+    out[:1] = np.nan
+    np.divide(close[1:], close[:-1], out=out[1:])
+    out[1:] -= 1.0
+    return out
+
+
+def equity_curve(returns, position=None):
+    """
+    逐日收益率 -> 净值（首行为 NaN）；给出持仓时按前一天的持仓计算当天收益，返回 (策略收益率, 策略净值)。
+    运算顺序与 compute_backtest（pct_change × shift(1) 后 cumprod）相同，结果逐位一致。
+    """
+    returns = kernels.as_float64(returns)
+    if position is not None:
+        strat = np.empty_like(returns)
+        strat[:1] = np.nan
+        np.multiply(returns[1:], position[:-1], out=strat[1:])
+        return strat, equity_curve(strat)
+    equity = np.empty_like(returns)
+    equity[:1] = np.nan
+    np.add(returns[1:], 1.0, out=equity[1:])
+    np.cumprod(equity[1:], out=equity[1:])
+    return equity
+
+
+# ========== 持仓：阈值为标量时持仓与指标同形（一维序列或 日期×代码 矩阵）；为一维数组时按 时间×low×high 广播 ==========
+def _grid(lows, highs):
+    lows = np.asarray(lows, dtype=np.float64)
+    highs = np.asarray(highs, dtype=np.float64)
+    if lows.ndim == 0 and highs.ndim == 0:
+        return lows, highs
+    return np.atleast_1d(lows)[:, None], np.atleast_1d(highs)
+
+
+def _column(x, low):
+    """指标加上与阈值网格对应的维度：(时间,) -> (时间, 1, 1)"""
+    x = kernels.as_float64(x)
+    return x.reshape(x.shape + (1,) * low.ndim)
+
+
+def rsi_position(rsi, lows, highs):
+    """仅RSI信号：RSI<low 持有，RSI>high 空仓，其余为空仓（与 rsi_signal_strategy 相同）"""
+    low, high = _grid(lows, highs)
+    rsi = _column(rsi, low)
+    return (rsi < low) & ~(rsi > high)
+
+
+def combo_position(rsi, dif, dea, lows, highs):
+    """RSI + MACD：RSI<low 且 DIF>DEA 时持有，RSI>high 或 DIF<DEA 时清仓（平仓优先）"""
+    low, high = _grid(lows, highs)
+    rsi, dif, dea = (_column(x, low) for x in (rsi, dif, dea))
+    return ((rsi < low) & (dif > dea)) & ~((rsi > high) | (dif < dea))
+
+
+def band_position(rsi, lows, highs):
+    """
+    RSI 低买高卖：RSI<low 时建仓并一直持有，直到 RSI>high 才清仓。
+    持仓只取决于最近一次建仓/清仓信号谁更晚：两者的位置各自按时间累计最大值后再比较，不需要逐行循环。
+    """
+    low, high = _grid(lows, highs)
+    rsi = _column(rsi, low)
+    t = np.arange(len(rsi)).reshape((-1,) + (1,) * (rsi.ndim - 1))
+    last_entry = np.maximum.accumulate(np.where(rsi < low, t, -1), axis=0)
+    last_exit = np.maximum.accumulate(np.where(rsi > high, t, -1), axis=0)
+    return last_entry > last_exit
+
+
+POSITIONS = {
+    'rsi': lambda ind, lows, highs: rsi_position(ind['RSI'], lows, highs),
+    'combo': lambda ind, lows, highs: combo_position(ind['RSI'], ind['DIF'], ind['DEA'], lows, highs),
+    'band': lambda ind, lows, highs: band_position(ind['RSI'], lows, highs),
+}
+
+
+def grid_metrics(returns, positions):
+    """
+    一次计算多组持仓的回测指标：returns 为逐日收益率（首行 NaN），positions 为 时间×组合 的 0/1 持仓。
+    与 compute_backtest 一致，当天收益按前一天的持仓计算；返回 {final, sharpe, max_dd}，每项长度为组合数。
+    """
+    returns = kernels.as_float64(returns)
+    strat = returns[1:, None] * positions[:-1]
+    equity = np.cumprod(1.0 + strat, axis=0)
+    peak = np.maximum.accumulate(equity, axis=0)
+    mean = strat.mean(axis=0)
+    std = strat.std(axis=0, ddof=1) if len(strat) > 1 else np.full(mean.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), np.nan)
+        max_dd = (equity / peak - 1.0).min(axis=0)
+    return {'final': equity[-1] - 1.0, 'sharpe': sharpe, 'max_dd': max_dd}
+
+
+def threshold_sweep(close, strategy, lows=SWEEP_LOWS, highs=SWEEP_HIGHS, indicators=None):
+    """
+    RSI 阈值参数扫描：指标只计算一次（或直接使用已算好的 indicators{RSI, DIF, DEA}），
+    全部 low×high 组合的持仓用广播一次得到，
+    返回 {final, sharpe, max_dd}，每项为 len(lows)×len(highs) 的矩阵（行=low，列=high）。
+    """
+    close = kernels.as_float64(close)
+    if indicators is None:
+        pipeline = IndicatorPipeline(close)
+        indicators = {name: pipeline.get(name) for name in ('RSI', 'DIF', 'DEA')}
+    positions = POSITIONS[strategy](indicators, lows, highs)
+    metrics = grid_metrics(simple_returns(close), positions.reshape(len(close), -1))
+    return {name: values.reshape(len(lows), len(highs)) for name, values in metrics.items()}
@@ -0,0 +1,150 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from config import BACKTEST_PROCESSES
+from logic_backtest import POSITIONS, grid_metrics, simple_returns
+from logic_calc import IndicatorPipeline
+from logic_rules import evaluate_rule
+
+
+MIN_BARS = 30  # 有效K线少于该值的股票不回测（与回测页一致）
+
+# 结果表的列：键 -> 展示名称
+RESULT_COLUMNS = {
+    'final': '策略收益率',
+    'buy_hold': '买入持有收益率',
+    'excess': '超额收益',
+    'sharpe': '夏普比率',
+    'max_dd': '最大回撤',
+    'exposure': '持仓比例',
+    'bars': 'K线数',
+}
+
+# 工作进程用 spawn 启动：Streamlit 进程里有多个后台线程，fork 可能复制到被占用的锁
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes):
+    """共享的进程池（批量回测、滚动优化共用）：多次调用之间复用，省去启动进程与导入模块的开销；进程数变化时重建"""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+            _pool_size = processes
+        return _pool
+
+
+def reset_pool():
+    """工作进程异常退出后丢弃进程池，下次调用重新创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def strategy_position(close, strategy, params):
+    """
+    一只股票的持仓（bool 数组）：strategy 为 logic_backtest.POSITIONS 中的内置策略（参数 low/high），
+    或 'rule'（参数 rule 为 logic_rules 的条件表达式，只能使用收盘价及其指标）。
+    """
+    if strategy == 'rule':
+        return evaluate_rule(params['rule'], pd.DataFrame({'Close': close}))
+    pipeline = IndicatorPipeline(close)
+    indicators = {name: pipeline.get(name) for name in ('RSI', 'DIF', 'DEA')}
+    return POSITIONS[strategy](indicators, params['low'], params['high'])
+
+
+def backtest_close(close, strategy, params):
+    """回测一只股票（收盘价中的空值为其他市场的交易日，先剔除），返回指标字典；数据不足时返回 None"""
+    close = close[~np.isnan(close)]
+    if len(close) < MIN_BARS:
+        return None
+    position = strategy_position(close, strategy, params)
+    # 策略与买入持有（始终满仓）两列一起计算
+    positions = np.column_stack([position, np.ones(len(close))])
+    metrics = grid_metrics(simple_returns(close), positions)
+    final, buy_hold = metrics['final']
+    return {
+        'final': final,
+        'buy_hold': buy_hold,
+        'excess': final - buy_hold,
+        'sharpe': metrics['sharpe'][0],
+        'max_dd': metrics['max_dd'][0],
+        'exposure': float(position.mean()),
+        'bars': len(close),
+    }
+
+
+def _backtest_shared(shm_name, shape, row, strategy, params):
+    """工作进程：从共享内存读取第 row 只股票的收盘价（只复制这一行）后回测"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        close = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)[row].copy()
+    finally:
+        shm.close()
+    return backtest_close(close, strategy, params)
+
+
+def iter_batch_backtest(closes, strategy, params, processes=BACKTEST_PROCESSES):
+    """
+    股票池批量回测：closes 为 日期×代码 收盘价宽表，按完成顺序逐只产出 (代码, 指标字典或 None)。
+    多进程时收盘价矩阵按 代码×日期 放入共享内存，任务只传共享内存名称与行号，不序列化价格数据。
+    processes 为 1 时在当前进程内逐只计算。
+    """
+    matrix = np.ascontiguousarray(closes.to_numpy(dtype=np.float64).T)
+    symbols = list(closes.columns)
+    if processes <= 1 or len(symbols) <= 1:
+        for row, symbol in enumerate(symbols):
+            yield symbol, backtest_close(matrix[row], strategy, params)
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    try:
+        np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)[:] = matrix
+        pool = get_pool(processes)
+        futures = {pool.submit(_backtest_shared, shm.name, matrix.shape, row, strategy, params): symbol
+                   for row, symbol in enumerate(symbols)}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        except BrokenProcessPool:
+            reset_pool()
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def results_frame(results, sort_by='final', ascending=False):
+    """{代码: 指标字典} -> 按 sort_by 排序的结果表（数据不足的股票各列为空，排在最后）"""
+    frame = pd.DataFrame([metrics or {} for metrics in results.values()],
+                         index=pd.Index(list(results), name='代码'), columns=list(RESULT_COLUMNS))
+    return frame.sort_values(sort_by, ascending=ascending, na_position='last', kind='mergesort')
+
+
+def batch_backtest(closes, strategy, params, sort_by='final', ascending=False,
+                   processes=BACKTEST_PROCESSES, on_result=None):
+    """
+    批量回测并返回按 sort_by 排序的结果表；每完成一只股票调用一次 on_result(当前结果表)，
+    页面可以据此逐步展示部分结果。
+    """
+    results = {}
+    for symbol, metrics in iter_batch_backtest(closes, strategy, params, processes):
+        results[symbol] = metrics
+        if on_result is not None:
+            on_result(results_frame(results, sort_by, ascending))
+    return results_frame(results, sort_by, ascending)
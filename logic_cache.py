@@ -0,0 +1,220 @@
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import SWR_ENABLED, SWR_MAX_STALE, SWR_WORKERS, CACHE_MAX_BYTES
+
+
+# 所有缓存共用的后台刷新线程池
+_refresh_executor = ThreadPoolExecutor(max_workers=SWR_WORKERS, thread_name_prefix="swr-refresh")
+
+
+def is_empty_result(value):
+    """上游返回的空结果（空表/空字典/空列表）不作为有效数据缓存或回退"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.empty
+    return value is None or (hasattr(value, '__len__') and len(value) == 0)
+
+
+_ARRAY_TYPES = (pd.DataFrame, pd.Series, pd.Index, np.ndarray)
+
+
+def measure_bytes(value):
+    """
+    估算缓存值占用的内存：DataFrame/Series 按实际内存（含索引与字符串），数组按 nbytes，
+    含数组或表的字典/元组/列表按各元素之和，其余按序列化大小
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    # 含数组/表的容器逐个累加，不必整体序列化
+    if isinstance(value, dict) and any(isinstance(v, _ARRAY_TYPES) for v in value.values()):
+        return sum(measure_bytes(k) + measure_bytes(v) for k, v in value.items())
+    if isinstance(value, (tuple, list)) and any(isinstance(v, _ARRAY_TYPES) for v in value):
+        return sum(measure_bytes(v) for v in value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class ByteBudget:
+    """
+    所有进程内缓存共用的内存预算：按最近使用顺序记录每个条目的大小，
+    总量超出 max_bytes 时从最久未使用的条目开始淘汰（跨缓存的全局 LRU）。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lru = OrderedDict()  # (缓存, key) -> 字节数
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def add(self, cache, key, size):
+        """登记（或更新）条目大小，返回需要淘汰的 (缓存, key) 列表；刚写入的条目不会被淘汰"""
+        victims = []
+        with self._lock:
+            self.total_bytes -= self._lru.pop((cache, key), 0)
+            self._lru[(cache, key)] = size
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._lru) > 1:
+                victim, victim_size = self._lru.popitem(last=False)
+                self.total_bytes -= victim_size
+                self.evictions += 1
+                self.evicted_bytes += victim_size
+                victims.append(victim)
+        return victims
+
+    def touch(self, cache, key):
+        with self._lock:
+            if (cache, key) in self._lru:
+                self._lru.move_to_end((cache, key))
+
+    def tracks(self, cache, key):
+        with self._lock:
+            return (cache, key) in self._lru
+
+
+_budget = ByteBudget(CACHE_MAX_BYTES)
+_caches = []
+
+
+class CacheEntry:
+    __slots__ = ("value", "fetched_at", "meta")
+
+    def __init__(self, value, fetched_at, meta=None):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.meta = meta
+
+
+class SWRCache:
+    """
+    进程内 TTL 缓存，支持 stale-while-revalidate：条目过期后（不超过 max_stale）先返回旧值，
+    同时在后台刷新，用户不必等待上游；同一 key 同时只有一个后台刷新任务。
+    """
+
+    def __init__(self, name, ttl, max_stale=SWR_MAX_STALE, swr=SWR_ENABLED, budget=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.swr = swr
+        self.budget = budget or _budget
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0,
+                      "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+        _caches.append(self)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def record(self, outcome):
+        """由 peek 直接服务请求的调用方记录结果（hits / stale_hits / misses），get 会自动记录"""
+        self._count(outcome)
+
+    def peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            self.budget.touch(self, key)
+        return entry
+
+    def put(self, key, value, meta=None):
+        entry = CacheEntry(value, time.time(), meta)
+        with self._lock:
+            self._entries[key] = entry
+        # 在缓存锁之外登记大小并淘汰，避免与其他缓存互相等待
+        for cache, victim_key in self.budget.add(self, key, measure_bytes(value)):
+            cache._drop(victim_key)
+        return entry
+
+    def _drop(self, key):
+        """被预算淘汰；若该 key 已被重新写入并登记则保留"""
+        if self.budget.tracks(self, key):
+            return
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.stats["evictions"] += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def is_fresh(self, entry):
+        return time.time() - entry.fetched_at < self.ttl
+
+    def can_serve_stale(self, entry):
+        return self.swr and time.time() - entry.fetched_at < self.ttl + self.max_stale
+
+    def refresh_async(self, key, refresh):
+        """在后台执行 refresh()（由它负责写回缓存）；该 key 已有刷新任务时忽略"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def _run():
+            try:
+                refresh()
+                self._count("refreshes")
+            except Exception:
+                self._count("refresh_errors")  # 刷新失败时保留旧值，下次请求再试
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _refresh_executor.submit(_run)
+
+    def _load(self, key, loader):
+        value = loader()
+        if not is_empty_result(value):  # 空结果不缓存，下次请求重新拉取
+            self.put(key, value)
+        return value
+
+    def get(self, key, loader):
+        """未过期直接返回；过期但可用时返回旧值并后台刷新；否则同步调用 loader()"""
+        entry = self.peek(key)
+        if entry is not None:
+            if self.is_fresh(entry):
+                self._count("hits")
+                return entry.value
+            if self.can_serve_stale(entry):
+                self._count("stale_hits")
+                self.refresh_async(key, lambda: self._load(key, loader))
+                return entry.value
+        self._count("misses")
+        return self._load(key, loader)
+
+    def status(self, key):
+        """条目的更新时间、是否已过期、是否正在后台刷新（不存在时返回 None）"""
+        entry = self.peek(key)
+        if entry is None:
+            return None
+        with self._lock:
+            refreshing = key in self._refreshing
+        return {"updated_at": entry.fetched_at, "stale": not self.is_fresh(entry),
+                "refreshing": refreshing}
+
+
+def get_cache_stats():
+    """内存缓存总占用、预算、淘汰统计，以及各缓存的条目数与命中情况"""
+    with _budget._lock:
+        stats = {"total_bytes": _budget.total_bytes, "max_bytes": _budget.max_bytes,
+                 "entries": len(_budget._lru), "evictions": _budget.evictions,
+                 "evicted_bytes": _budget.evicted_bytes}
+    stats["caches"] = {c.name: dict(c.stats, entries=len(c)) for c in _caches}
+    return stats
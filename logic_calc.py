@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 
+import logic_kernels as kernels
+
 
 def calc_price_metrics(df):
     """计算价格涨跌幅（原始代码中col1-col3的逻辑）"""
@@ -12,50 +15,150 @@ def calc_price_metrics(df):
     return None, None, None
 
 
+# 指标参数默认值（与 calc_* 函数的默认参数一致）
+DEFAULT_PARAMS = {
+    'sma_window': 50,
+    'rsi_period': 14,
+    'macd_short': 12,
+    'macd_long': 26,
+    'macd_signal': 9,
+}
+
+# 指标计算图：名称 -> (依赖的节点, 计算函数)；计算函数的参数为 (参数字典, *依赖节点的值)，
+# 节点的值为与K线等长的 NumPy 数组（见 logic_kernels），最后再作为列写回 DataFrame
+_NODES = {}
+
+
+def indicator(name, *deps):
+    """注册一个指标节点，声明它依赖的节点（'Close' 为输入的收盘价）"""
+    def register(fn):
+        _NODES[name] = (deps, fn)
+        return fn
+    return register
+
+
+@indicator('SMA_50', 'Close')
+def _sma(p, close):
+    return kernels.rolling_mean(close, p['sma_window'])
+
+
+@indicator('delta', 'Close')
+def _delta(p, close):
+    # 计算每日价格变动（首行为空值，RSI 的涨跌幅共用）
+    return kernels.diff(close)
+
+
+@indicator('gain_loss', 'delta')
+def _gain_loss(p, delta):
+    # 平均涨幅、平均跌幅（空值先剔除再滚动，与原 dropna 写法一致）
+    return kernels.gain_loss(delta, p['rsi_period'])
+
+
+@indicator('RSI', 'gain_loss')
+def _rsi(p, gain_loss):
+    return kernels.rsi_from_means(*gain_loss)
+
+
+@indicator('RSI_Signal', 'RSI')
+def _rsi_signal(p, rsi):
+    # 0=无信号，1=买入（超卖），-1=卖出（超买）
+    return np.where(rsi < 30, 1, np.where(rsi > 70, -1, 0))
+
+
+@indicator('EMA_short', 'Close')
+def _ema_short(p, close):
+    return kernels.ema(close, p['macd_short'])
+
+
+@indicator('EMA_long', 'Close')
+def _ema_long(p, close):
+    return kernels.ema(close, p['macd_long'])
+
+
+@indicator('DIF', 'EMA_short', 'EMA_long')
+def _dif(p, ema_short, ema_long):
+    return ema_short - ema_long
+
+
+@indicator('DEA', 'DIF')
+def _dea(p, dif):
+    return kernels.ema(dif, p['macd_signal'])
+
+
+@indicator('MACD_BAR', 'DIF', 'DEA')
+def _macd_bar(p, dif, dea):
+    return 2 * (dif - dea)
+
+
+@indicator('MACD_Crossover', 'DIF', 'DEA')
+def _macd_crossover(p, dif, dea):
+    # 0=无信号，1=金叉（前一天DIF<DEA，当天DIF>DEA），-1=死叉（前一天DIF>DEA，当天DIF<DEA）
+    return kernels.crossover(dif, dea)
+
+
+# 主页面指标卡、信号判断与三张指标图用到的全部指标列
+MAIN_INDICATORS = ('SMA_50', 'RSI', 'RSI_Signal', 'DIF', 'DEA', 'MACD_BAR', 'MACD_Crossover')
+
+
+class IndicatorPipeline:
+    """
+    按依赖声明计算指标：每个节点在一次计算中只算一次（如 RSI 的涨跌幅、MACD 的两条 EMA），
+    请求多个指标时共享中间结果。
+    """
+
+    def __init__(self, close, **params):
+        self.params = {**DEFAULT_PARAMS, **params}
+        self._values = {'Close': kernels.as_float64(close)}
+
+    def get(self, name):
+        if name not in self._values:
+            deps, fn = _NODES[name]
+            self._values[name] = fn(self.params, *(self.get(d) for d in deps))
+        return self._values[name]
+
+    def frame(self, df, names=MAIN_INDICATORS):
+        """在K线后追加 names 中的指标列，返回新的 DataFrame（不修改 df）"""
+        return df.assign(**{name: self.get(name) for name in names})
+
+
+def calc_indicators(df, names=MAIN_INDICATORS, **params):
+    """一次计算多个指标（共享中间结果），返回追加了指标列的新 DataFrame"""
+    return IndicatorPipeline(df['Close'], **params).frame(df, names)
+
+
+def calc_indicator_matrix(closes, names=MAIN_INDICATORS, **params):
+    """
+    多只股票一次向量化计算：closes 为 日期×代码 的收盘价宽表，各股票上市日期、休市日不同，缺失处为 NaN。
+    每列按自己的交易日序列计算（缺失的日期不计入窗口、不影响 EMA 递推，也不会产生交叉信号），
+    与逐只对 closes[代码].dropna() 调用 calc_indicators 的结果相同。
+    返回 {指标名: 日期×代码 DataFrame}，某股票当天没有K线时为 NaN（信号列为 0）。
+    """
+    compact, order = kernels.compact_columns(closes.to_numpy(dtype=np.float64))
+    pipeline = IndicatorPipeline(compact, **params)
+    return {name: pd.DataFrame(kernels.expand_columns(pipeline.get(name), order),
+                               index=closes.index, columns=closes.columns)
+            for name in names}
+
+
 def calc_sma_50(df):
     """计算50日简单移动平均线（原始代码中tab1的逻辑）"""
-    df['SMA_50'] = df['Close'].rolling(window=50).mean()
+    df['SMA_50'] = IndicatorPipeline(df['Close']).get('SMA_50')
     return df
 
 
 def calc_RSI(df, period=14):
     """计算相对强弱指数RSI（新增功能）"""
-    delta = df['Close'].diff()
-    delta = delta.dropna()  # 计算每日价格变动,参数为1表示计算当前行与前一行的差值，默认是1
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    df['RSI'] = rsi
-
+    pipeline = IndicatorPipeline(df['Close'], rsi_period=period)
+    df['RSI'] = pipeline.get('RSI')
     # 生成RSI买卖信号
-    df['RSI_Signal'] = 0  # 0=无信号，1=买入，-1=卖出
-    df.loc[df['RSI'] < 30, 'RSI_Signal'] = 1    # 超卖→买入
-    df.loc[df['RSI'] > 70, 'RSI_Signal'] = -1   # 超买→卖出
-
+    df['RSI_Signal'] = pipeline.get('RSI_Signal')  # 0=无信号，1=买入，-1=卖出
     return df
 
 
 def calc_MACD(df, short_window=12, long_window=26, signal_window=9):
     """计算移动平均收敛散度指标MACD（新增功能）"""
-    exp1 = df['Close'].ewm(span=short_window, adjust=False).mean()
-    exp2 = df['Close'].ewm(span=long_window, adjust=False).mean()
-    DIF = exp1 - exp2
-    DEA = DIF.ewm(span=signal_window, adjust=False).mean()
-    df['DIF'] = DIF
-    df['DEA'] = DEA
-    df['MACD_BAR'] = 2 * (DIF - DEA)
-
-    # 生成MACD买卖信号（金叉/死叉）
-    df['MACD_Crossover'] = 0  # 0=无信号，1=金叉（买入），-1=死叉（卖出）
-    # 金叉：DIF上穿DEA（前一天DIF<DEA，当天DIF>DEA）
-    df.loc[(df['DIF'].shift(1) < df['DEA'].shift(1)) &
-           (df['DIF'] > df['DEA']), 'MACD_Crossover'] = 1
-    # 死叉：DIF下穿DEA（前一天DIF>DEA，当天DIF<DEA）
-    df.loc[(df['DIF'].shift(1) > df['DEA'].shift(1)) &
-           (df['DIF'] < df['DEA']), 'MACD_Crossover'] = -1
-    
-
+    pipeline = IndicatorPipeline(df['Close'], macd_short=short_window,
+                                 macd_long=long_window, macd_signal=signal_window)
+    for name in ('DIF', 'DEA', 'MACD_BAR', 'MACD_Crossover'):
+        df[name] = pipeline.get(name)
     return df
-
-
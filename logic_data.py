@@ -1,63 +1,402 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-import time
-import random
-from config import CACHE_TTL
-
-
-@st.cache_data(ttl=CACHE_TTL)  # 1小时缓存，减少请求（原始注释保留）
-def get_data(symbol, period):
-    # 初始化返回值，确保即使报错也有值（原始注释保留）
-    hist_df = pd.DataFrame()
-    info = {}
-    news = []
-    
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            # 函数内局部变量stock，外部无需访问（原始注释保留）
-            stock_inner = yf.Ticker(symbol)
-            hist_df = stock_inner.history(period=period)
-            info = stock_inner.info or {}  # 确保info是字典（原始注释保留）
-            news = stock_inner.news or []  # 确保news是列表（原始注释保留）
-            break  # 成功则跳出循环
-        except Exception as e:
-            if "429" in str(e) or "Too Many Requests" in str(e):
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + random.uniform(0, 1)  # 指数退避 + 随机
-                    st.warning(f"请求过于频繁，正在重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    st.error(f"数据获取失败：请求过于频繁，请稍后再试。错误详情：{str(e)}")
+from config import (
+    CACHE_TTL, INFO_CACHE_TTL, NEWS_CACHE_TTL, ACCESS_HALF_LIFE, FUNDAMENTALS_WORKERS, BACKTEST_LOAD_WORKERS
+)
+from logic_store import (
+    refresh_bars, load_bars, compact_bars, slice_period, period_covers, PERIOD_ORDER,
+    load_fundamentals, save_fundamentals, fundamentals_expired
+)
+from logic_ratelimit import limited_call, UpstreamUnavailable
+from logic_shared_cache import shared_fetch, shared_lock
+from logic_provider import get_provider, STATEMENTS, STATEMENT_FREQS
+from logic_cache import SWRCache, is_empty_result
+from logic_calc import IndicatorPipeline, calc_indicators
+from logic_backtest import equity_curve, simple_returns
+
+
+class SingleFlight:
+    """
+    在途请求合并：同一 key（类型, 股票代码, 周期）同时只向上游发出一个请求，
+    其余并发调用方等待同一个 Future 的结果（或异常）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.stats = {"issued": 0, "coalesced": 0}
+
+    def do(self, key, fetch):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.stats["issued"] += 1
             else:
-                st.error(f"数据获取失败：{str(e)}")
-                break
-    return hist_df, info, news
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def snapshot_stats(self):
+        """统计计数的副本（加锁读取，不会读到更新了一半的计数）"""
+        with self._lock:
+            return dict(self.stats)
+
+
+# 进程内所有会话共享，缓存同时失效时 N 个会话只触发 1 次上游请求
+_single_flight = SingleFlight()
+
+
+def fetch_upstream(key, fetch, ttl=None):
+    """
+    上游请求统一入口：先合并进程内在途的相同请求，再查跨进程共享缓存（ttl 不为空时，
+    命中则不访问上游），最后经限流闸门发出。
+    """
+    return _single_flight.do(key, lambda: shared_fetch(key, lambda: limited_call(key, fetch), ttl))
+
+
+def get_singleflight_stats():
+    """返回在途合并统计：issued=实际发出的请求数，coalesced=被合并的请求数"""
+    return _single_flight.snapshot_stats()
+
+
+def _guarded(fetch, label, default):
+    """调用 fetch()；上游不可用时提示并返回默认值（不在脚本线程里 sleep 重试）"""
+    try:
+        return fetch()
+    except UpstreamUnavailable as e:
+        st.warning(f"{label}暂不可用：{str(e)}")
+    except Exception as e:
+        st.error(f"{label}获取失败：{str(e)}")
+    return default
+
+
+# 股票代码 -> 覆盖最长周期的完整K线（meta 为覆盖周期）；进程内所有会话共享
+_history_cache = SWRCache("history", CACHE_TTL)
+_info_cache = SWRCache("info", INFO_CACHE_TTL)
+_news_cache = SWRCache("news", NEWS_CACHE_TTL)
+# 财报不按 TTL 过期，是否失效由报告期决定（见 fundamentals_expired），meta 为本地库元信息
+_fundamentals_cache = SWRCache("fundamentals", float("inf"), swr=False)
+# (股票代码, 周期) -> K线+指标列，meta 为计算时K线缓存的版本（写入时间），版本变化后重算
+_indicator_cache = SWRCache("indicators", float("inf"), swr=False)
+# (股票代码, 周期) -> 回测用的 NumPy 数组，meta 同上为K线缓存的版本
+_backtest_cache = SWRCache("backtest", float("inf"), swr=False)
+_stats_lock = threading.Lock()
+
+# 交互请求统计：股票代码 -> (按半衰期衰减的请求热度, 最近请求时间)；warm=命中已预热的缓存
+_access_scores = {}
+_warm_stats = {"warm": 0, "cold": 0}
+
+
+def _cached_history(symbol, period):
+    """
+    内存中覆盖请求周期时返回切片，否则返回 None。
+    已过期但仍在可接受范围内时同样直接返回旧数据，并在后台刷新（stale-while-revalidate）。
+    """
+    entry = _history_cache.peek(symbol)
+    if entry is not None and period_covers(entry.meta, period):
+        if _history_cache.is_fresh(entry):
+            _history_cache.record("hits")
+            return slice_period(entry.value, period)
+        if _history_cache.can_serve_stale(entry):
+            _history_cache.record("stale_hits")
+            covered = entry.meta
+            _history_cache.refresh_async(symbol, lambda: refresh_history(symbol, covered))
+            return slice_period(entry.value, period)
+    _history_cache.record("misses")
+    return None
+
+
+def _record_request(symbol, warm):
+    now = time.time()
+    with _stats_lock:
+        score, last = _access_scores.get(symbol, (0.0, now))
+        score = score * 0.5 ** ((now - last) / ACCESS_HALF_LIFE) + 1
+        _access_scores[symbol] = (score, now)
+        _warm_stats["warm" if warm else "cold"] += 1
+
+
+def refresh_history(symbol, period):
+    """
+    刷新并缓存某只股票的K线（不经过请求统计，供交互请求与后台预取共用），上游不可用时抛出异常。
+    按已缓存周期与请求周期中较长的一个刷新，避免缩小已有的覆盖范围。
+    """
+    entry = _history_cache.peek(symbol)
+    fetch_period = entry.meta if entry is not None and period_covers(entry.meta, period) else period
+    provider = get_provider()
+
+    def _history(**kw):
+        return limited_call(("history", symbol, tuple(sorted(kw.items()))),
+                            lambda: provider.history(symbol, **kw))
+
+    def _refresh():
+        # 多个进程同时刷新同一股票时只有一个访问上游，其余等待后直接读本地K线库
+        with shared_lock(("history", symbol)):
+            return refresh_bars(symbol, fetch_period, _history, max_age=CACHE_TTL)
+
+    # 返回 (K线, 覆盖周期)，与 fetch_upstream 的 ("history", ...) 请求（返回 DataFrame）使用不同的 key
+    bars, covered = _single_flight.do(("history_store", symbol, fetch_period), _refresh)
+    # 本地库保持原始精度，只有内存缓存保存压缩后的K线
+    bars = compact_bars(bars)
+    if not bars.empty and covered in PERIOD_ORDER:
+        _history_cache.put(symbol, bars, meta=covered)
+    return bars
+
+
+def get_history(symbol, period, quiet=False):
+    """
+    获取K线历史。同一股票只缓存一份覆盖最长周期的K线，较短周期直接按日期切片返回
+    （切片为视图，不复制数据；需要修改时调用方先 copy）。只有缓存过期或请求了更长周期时才访问上游，
+    并且优先读本地K线库，仅增量拉取最新K线。
+    quiet=True 时上游失败不在页面上提示（供线程池中的批量读取使用），同样回退到本地K线库。
+    """
+    cached = _cached_history(symbol, period)
+    _record_request(symbol, warm=cached is not None)
+    if cached is not None:
+        return cached
+
+    if quiet:
+        try:
+            bars = refresh_history(symbol, period)
+        except Exception:
+            bars = pd.DataFrame()
+    else:
+        bars = _guarded(lambda: refresh_history(symbol, period), "行情数据", pd.DataFrame())
+    if bars.empty:
+        # 上游不可用时回退到本地K线库中的旧数据
+        bars = compact_bars(load_bars(symbol)[0])
+    return slice_period(bars, period)
+
+
+def get_histories(symbols, period, max_workers=BACKTEST_LOAD_WORKERS):
+    """
+    并发读取多只股票的K线（与 get_history 相同：内存缓存 → 上游增量 → 本地K线库），返回 {代码: K线}。
+    在线程池中运行，不在页面上逐只提示错误；拿不到数据的代码对应空表，由调用方汇总提示。
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as pool:
+        return dict(zip(symbols, pool.map(lambda s: get_history(s, period, quiet=True), symbols)))
+
+
+def history_version(symbol):
+    """内存中K线缓存的版本（写入时间），每次刷新写回都会变化；未缓存时返回 None"""
+    entry = _history_cache.peek(symbol)
+    return entry.fetched_at if entry is not None else None
+
+
+def get_indicator_frame(symbol, period):
+    """
+    K线及主页面用到的全部指标列（见 logic_calc.MAIN_INDICATORS），按 (代码, 周期, 数据版本) 记忆化：
+    切换指标图、点按钮导致的重跑都直接复用，只有K线刷新后才重新计算。返回值为共享对象，调用方不要修改。
+    """
+    # 先取版本再取数据：两者之间若有后台刷新，只会让下次渲染多算一次
+    version = history_version(symbol)
+    bars = get_history(symbol, period)
+    if version is None:
+        version = history_version(symbol)  # 本次调用才同步加载的K线
+    if bars.empty:
+        return bars
+    entry = _indicator_cache.peek((symbol, period))
+    if entry is not None and version is not None and entry.meta == version:
+        _indicator_cache.record("hits")
+        return entry.value
+    _indicator_cache.record("misses")
+    frame = calc_indicators(bars)
+    if version is not None:
+        _indicator_cache.put((symbol, period), frame, meta=version)
+    return frame
+
+
+def get_backtest_arrays(symbol, period):
+    """
+    策略回测用的数组（收盘价有效的行）：Close/RSI/DIF/DEA、逐日收益率 Return、买入持有净值 Equity_BuyHold 与日期 Index。
+    指标在去掉缺失收盘价后的序列上计算，按 (代码, 周期, 数据版本) 缓存：调整阈值时只需重算持仓与策略净值。
+    没有数据时返回 None；返回值为共享对象，调用方不要修改。
+    """
+    version = history_version(symbol)
+    bars = get_history(symbol, period)
+    if version is None:
+        version = history_version(symbol)
+    if bars.empty:
+        return None
+    entry = _backtest_cache.peek((symbol, period))
+    if entry is not None and version is not None and entry.meta == version:
+        _backtest_cache.record("hits")
+        return entry.value
+    _backtest_cache.record("misses")
+    close = bars["Close"].dropna()
+    if close.empty:
+        return None
+    pipeline = IndicatorPipeline(close)
+    arrays = {name: pipeline.get(name) for name in ("Close", "RSI", "DIF", "DEA")}
+    arrays["Return"] = simple_returns(arrays["Close"])
+    arrays["Equity_BuyHold"] = equity_curve(arrays["Return"])
+    arrays["Index"] = close.index
+    if version is not None:
+        _backtest_cache.put((symbol, period), arrays, meta=version)
+    return arrays
+
+
+def history_age(symbol):
+    """内存中K线缓存的 (已缓存秒数, 覆盖周期)，未缓存时返回 None"""
+    entry = _history_cache.peek(symbol)
+    if entry is None:
+        return None
+    return time.time() - entry.fetched_at, entry.meta
+
+
+def get_data_status(symbol):
+    """K线数据的更新时间、是否已过期、是否正在后台刷新（供页面展示数据新鲜度）"""
+    return _history_cache.status(symbol)
+
+
+def get_access_scores():
+    """各股票当前的请求热度（越近、越频繁越高）"""
+    now = time.time()
+    with _stats_lock:
+        return {s: score * 0.5 ** ((now - last) / ACCESS_HALF_LIFE)
+                for s, (score, last) in _access_scores.items()}
+
+
+def get_warm_hit_stats():
+    """交互请求命中已预热缓存的次数与比例"""
+    with _stats_lock:
+        stats = dict(_warm_stats)
+    total = stats["warm"] + stats["cold"]
+    stats["ratio"] = stats["warm"] / total if total else None
+    return stats
+
+
+def _fetch_info(symbol):
+    return fetch_upstream(("info", symbol), lambda: get_provider().info(symbol), ttl=INFO_CACHE_TTL)
+
+
+def refresh_info(symbol):
+    """
+    刷新并缓存公司基本信息（供后台预取使用，不在页面上提示）：缓存未过期时直接返回，
+    否则同步拉取，上游不可用时抛出异常。
+    """
+    entry = _info_cache.peek(symbol)
+    if entry is not None and _info_cache.is_fresh(entry):
+        return entry.value
+    info = _fetch_info(symbol)
+    if not is_empty_result(info):
+        _info_cache.put(symbol, info)
+    return info
+
+
+def get_info(symbol):
+    """获取公司基本信息（变化很慢，按股票代码长时间缓存，与周期无关；过期后先返回旧值再后台刷新）"""
+    return _guarded(lambda: _info_cache.get(symbol, lambda: _fetch_info(symbol)), "公司信息", {})
+
+
+def get_news(symbol):
+    """获取最新新闻（短时间缓存，与周期无关；过期后先返回旧值再后台刷新）"""
+    return _guarded(
+        lambda: _news_cache.get(symbol, lambda: fetch_upstream(
+            ("news", symbol), lambda: get_provider().news(symbol), ttl=NEWS_CACHE_TTL)),
+        "新闻", [])
+
+
+def _fetch_statement(symbol, kind):
+    """同一张报表的年度与季度数据（在一个线程内依次拉取）"""
+    return {(kind, freq): fetch_upstream(("statement", symbol, kind, freq),
+                                         lambda freq=freq: get_provider().statement(symbol, kind, freq))
+            for freq in STATEMENT_FREQS}
+
+
+def refresh_fundamentals(symbol, most_recent_quarter=None):
+    """
+    拉取三张财务报表（年度+季度）并写入本地财报库，返回 (报表字典, 元信息)。
+    本地数据未失效（见 fundamentals_expired，可能刚被其他进程刷新）时直接返回；
+    三张报表并发拉取，某张失败或为空时沿用本地旧数据，全部失败且本地没有数据时抛出异常。
+    """
+    def _refresh():
+        with shared_lock(("fundamentals", symbol)):
+            old, meta = load_fundamentals(symbol)
+            if old and not fundamentals_expired(meta, most_recent_quarter):
+                return old, meta
+
+            fresh, errors = {}, []
+            with ThreadPoolExecutor(max_workers=FUNDAMENTALS_WORKERS) as pool:
+                futures = [pool.submit(_fetch_statement, symbol, kind) for kind in STATEMENTS]
+            for future in futures:
+                try:
+                    fresh.update(future.result())
+                except Exception as e:
+                    errors.append(e)
+            if errors and not fresh:
+                if old:
+                    return old, meta
+                raise errors[0]
+
+            statements = {}
+            for key in ((kind, freq) for kind in STATEMENTS for freq in STATEMENT_FREQS):
+                df = fresh.get(key)
+                if df is None or df.empty:
+                    df = old.get(key, pd.DataFrame())
+                statements[key] = df
+            meta = save_fundamentals(symbol, statements)
+            _fundamentals_cache.put(symbol, statements, meta=meta)
+            return statements, meta
+
+    return _single_flight.do(("fundamentals", symbol), _refresh)
+
+
+def get_fundamentals(ticker_symbol, info=None):
+    """
+    三张财务报表 {(报表, 频率): DataFrame}（报表见 STATEMENTS，频率见 STATEMENT_FREQS）。
+    按报告期失效而不是按短 TTL：内存或本地库中有数据时直接返回，已失效则后台刷新；
+    传入 info 时用其中的 mostRecentQuarter 判断是否已有新季报。
+    """
+    most_recent_quarter = (info or {}).get("mostRecentQuarter")
+    entry = _fundamentals_cache.peek(ticker_symbol)
+    if entry is None:
+        _fundamentals_cache.record("misses")
+        statements, meta = load_fundamentals(ticker_symbol)
+        if statements:
+            entry = _fundamentals_cache.put(ticker_symbol, statements, meta=meta)
+    elif fundamentals_expired(entry.meta, most_recent_quarter):
+        _fundamentals_cache.record("stale_hits")
+    else:
+        _fundamentals_cache.record("hits")
+    if entry is not None:
+        if fundamentals_expired(entry.meta, most_recent_quarter):
+            _fundamentals_cache.refresh_async(
+                ticker_symbol, lambda: refresh_fundamentals(ticker_symbol, most_recent_quarter))
+        return entry.value
+    statements, _ = _guarded(lambda: refresh_fundamentals(ticker_symbol, most_recent_quarter),
+                             "财务报表", ({}, {}))
+    return statements
+
+
+def get_fundamentals_status(ticker_symbol):
+    """财报的最新报告期、预计下次披露日与拉取时间（没有数据时返回 None）"""
+    entry = _fundamentals_cache.peek(ticker_symbol)
+    return entry.meta if entry is not None else None
 
 
 def get_balance_sheet(ticker_symbol):
     """获取资产负债表（原始代码中tab3的逻辑）"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            # 重新初始化 Ticker 对象以获取资产负债表（避免缓存问题）（原始注释保留）
-            stock_inner = yf.Ticker(ticker_symbol)
-            # 获取股票的资产负债表数据（原始注释保留）
-            balance_sheet = stock_inner.balance_sheet
-            return balance_sheet
-        except Exception as e:
-            if "429" in str(e) or "Too Many Requests" in str(e):
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + random.uniform(0, 1)
-                    st.warning(f"资产负债表请求过于频繁，正在重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    st.warning(f"获取资产负债表失败：请求过于频繁，请稍后再试。错误详情：{str(e)}")
-                    return pd.DataFrame()
-            else:
-                st.warning(f"获取资产负债表失败：{str(e)}")  # 原始容错逻辑
-                return pd.DataFrame()
-    return pd.DataFrame()
+    # 来自本地财报库（年度报表），按报告期失效
+    return get_fundamentals(ticker_symbol).get(("balance_sheet", "annual"), pd.DataFrame())
@@ -0,0 +1,102 @@
+import numpy as np
+
+from logic_backtest import simple_returns
+
+
+# 交易方向（trade 数组中的取值）
+BUY, SELL, STOP_LOSS, TAKE_PROFIT = 1, -1, -2, -3
+
+
+def run_events(close, target, fee_bps=0.0, slippage=0.0, size=1.0, stop_loss=None, take_profit=None):
+    """
+    逐根K线的事件驱动回测：target 为每根K线收盘时的目标持仓（0/1），按收盘价成交，持有到下一根K线。
+    - fee_bps：每次成交按成交金额收取的手续费（基点）
+    - slippage：每股固定滑点（价格单位），买入成交价 = 收盘价 + slippage，卖出 = 收盘价 - slippage
+    - size：建仓时投入当前权益的比例（0~1），其余为现金
+    - stop_loss / take_profit：相对成交价的止损/止盈比例（如 0.05），按收盘价判断；
+      触发后平仓，目标持仓回到 0 之后才会再次建仓
+
+    状态保存在预先分配的数组中，循环内只做标量运算。持仓市值按 (1 + 当日收益率) 逐日累乘，
+    成本为 0 且满仓时与 compute_backtest 的逐日运算完全相同，结果逐位一致。
+    返回 {returns, position, trade, cost, equity}：position 为每根K线收盘后的实际持仓，
+    trade 为当根K线的成交（BUY/SELL/STOP_LOSS/TAKE_PROFIT，0=无），cost 为手续费与滑点成本。
+    收盘价不为正、滑点不小于最低收盘价或其余参数超出范围时抛出 ValueError。
+    """
+    if not 0.0 < size <= 1.0:
+        raise ValueError("建仓比例必须在 0~1 之间")
+    if fee_bps < 0:
+        raise ValueError("手续费不能为负数")
+    if stop_loss is not None and not 0.0 <= stop_loss < 1.0:
+        raise ValueError("止损比例必须在 0~1 之间")
+    if take_profit is not None and take_profit < 0:
+        raise ValueError("止盈比例不能为负数")
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    # 成交价 = 收盘价 ± 滑点，需保持为正：价格为 0 无法计算持仓数量，滑点不小于价格时卖出所得为负
+    if (close <= 0).any():
+        raise ValueError("收盘价必须大于 0")
+    if slippage < 0:
+        raise ValueError("滑点不能为负数")
+    if len(close) and slippage >= np.nanmin(close):
+        raise ValueError("滑点必须小于最低收盘价")
+    n = len(close)
+    returns = simple_returns(close)
+    position = np.zeros(n, dtype=np.int8)
+    trade = np.zeros(n, dtype=np.int8)
+    cost = np.zeros(n)
+    equity = np.empty(n)
+    if n == 0:
+        return {'returns': returns, 'position': position, 'trade': trade, 'cost': cost, 'equity': equity}
+
+    # 循环内按下标读取 Python 列表比逐个读取 NumPy 标量快得多
+    prices = close.tolist()
+    growth = (1.0 + returns).tolist()
+    wants = (np.asarray(target) > 0).tolist()
+    fee_rate = fee_bps / 10_000.0
+    stop_level = 1.0 - stop_loss if stop_loss else None
+    take_level = 1.0 + take_profit if take_profit else None
+
+    cash, value = 1.0, 0.0  # 现金与持仓市值（初始权益为 1）
+    holding = False
+    blocked = False  # 止损/止盈后等待目标持仓复位
+    entry = 0.0
+    for i in range(n):
+        price = prices[i]
+        if holding and i:
+            value *= growth[i]
+        want = wants[i]
+        if blocked and not want:
+            blocked = False
+
+        action = 0
+        if holding:
+            if stop_level is not None and price <= entry * stop_level:
+                action = STOP_LOSS
+            elif take_level is not None and price >= entry * take_level:
+                action = TAKE_PROFIT
+            elif not want:
+                action = SELL
+        elif want and not blocked:
+            action = BUY
+
+        if action == BUY:
+            invest = (cash + value) * size
+            fill = price + slippage
+            fee = invest * fee_rate
+            value = invest * (price / fill)  # 无滑点时恰为 invest
+            cash -= invest + fee
+            cost[i] = fee + invest - value
+            entry = fill
+            holding = True
+        elif action:
+            fill = price - slippage
+            proceeds = value * (fill / price)
+            fee = proceeds * fee_rate
+            cash += proceeds - fee
+            cost[i] = fee + value - proceeds
+            value = 0.0
+            holding = False
+            blocked = action != SELL
+        trade[i] = action
+        position[i] = holding
+        equity[i] = cash + value
+    return {'returns': returns, 'position': position, 'trade': trade, 'cost': cost, 'equity': equity}
@@ -0,0 +1,284 @@
+import numpy as np
+
+
+# EMA 分块递推时，块内累计衰减不低于 e^-_EMA_BLOCK_LOG_RANGE，避免累乘因子下溢
+_EMA_BLOCK_LOG_RANGE = 300.0
+
+
+def as_float64(values):
+    """转为连续的 float64 数组（已经是时不复制）"""
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def _out(out, shape, dtype=np.float64):
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != shape:
+        raise ValueError(f"输出缓冲区形状应为 {shape}，实际为 {out.shape}")
+    return out
+
+
+def compact_columns(x):
+    """
+    二维数组（时间×股票）每列的有效值按原顺序下沉到底部，空值移到顶部，返回 (压缩后的数组, 行号)。
+    压缩后每列只有开头是空值，相当于各股票按自己的交易日序列排列；用 expand_columns 还原。
+    """
+    x = as_float64(x)
+    order = np.argsort(~np.isnan(x), axis=0, kind='stable')
+    return np.take_along_axis(x, order, axis=0), order
+
+
+def expand_columns(values, order):
+    """把压缩空间中的结果放回原来的行（compact_columns 的逆操作）"""
+    out = np.empty_like(values)
+    np.put_along_axis(out, order, values, axis=0)
+    return out
+
+
+def diff(x, out=None):
+    """一阶差分（首行为 NaN），与 Series.diff() 相同；二维数组按列（axis=0）计算"""
+    x = as_float64(x)
+    out = _out(out, x.shape)
+    out[:1] = np.nan
+    np.subtract(x[1:], x[:-1], out=out[1:])
+    return out
+
+
+def rolling_mean(x, window, out=None):
+    """
+    滚动均值（窗口内必须全部为有效值，否则为 NaN，与 rolling(window).mean() 相同）。
+    用累加和相减实现，每行 O(1)；累加前减去首个有效值，降低长序列的累加误差。
+    二维数组（时间×股票）按列计算。
+    """
+    x = as_float64(x)
+    n = x.shape[0]
+    out = _out(out, x.shape)
+    if n < window:
+        out[:] = np.nan
+        return out
+    valid = ~np.isnan(x)
+    first = np.argmax(valid, axis=0)
+    ref = np.take_along_axis(x, first[None], axis=0) if x.ndim > 1 else x[first]
+    ref = np.where(np.isnan(ref), 0.0, ref)
+
+    sums = np.empty((n + 1,) + x.shape[1:])
+    sums[0] = 0.0
+    np.cumsum(np.where(valid, x - ref, 0.0), axis=0, out=sums[1:])
+    counts = np.zeros((n + 1,) + x.shape[1:], dtype=np.int64)
+    np.cumsum(valid, axis=0, out=counts[1:])
+
+    out[:window - 1] = np.nan
+    tail = out[window - 1:]
+    np.subtract(sums[window:], sums[:-window], out=tail)
+    tail /= window
+    tail += ref
+    tail[(counts[window:] - counts[:-window]) < window] = np.nan
+    return out
+
+
+def _block_size(min_decay):
+    if min_decay <= 0:
+        return 1
+    return max(1, int(_EMA_BLOCK_LOG_RANGE / max(-np.log(min_decay), 1e-12)))
+
+
+def _linear_recurrence(b, decay, y0, out):
+    """
+    y[j] = decay[j] * y[j-1] + b[j]（y[-1] = y0）的分块向量化解：
+    块内 y = P * (y0 + cumsum(b / P))，P 为 decay 的累乘；块长保证 P 不会下溢。
+    decay 为标量时各块共用同一组累乘因子。
+    """
+    n = len(b)
+    if n == 0:
+        return out
+    constant = np.ndim(decay) == 0
+    block = _block_size(float(np.min(decay)))
+    if constant:
+        powers = np.cumprod(np.full(min(block, n), decay))
+    extra_dims = (1,) * (np.ndim(b) - 1)  # 二维时累乘因子按列广播
+    prev = y0
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        p = powers[:stop - start] if constant else np.cumprod(decay[start:stop])
+        p = p.reshape(p.shape + extra_dims)
+        seg = out[start:stop]
+        np.divide(b[start:stop], p, out=seg)
+        np.cumsum(seg, axis=0, out=seg)
+        seg += prev
+        seg *= p
+        prev = seg[-1]
+    return out
+
+
+def ema(x, span, out=None):
+    """
+    指数移动平均（adjust=False），与 ewm(span=span, adjust=False).mean() 相同：
+    开头的 NaN 保持 NaN；中间的 NaN 行沿用上一个值，之后的新值按跳过的行数加大权重。
+    二维数组按列计算，每列只允许开头为空值（各股票上市日期不同，见 compact_columns）。
+    """
+    x = as_float64(x)
+    n = len(x)
+    out = _out(out, x.shape)
+    alpha = 1.0 / (1.0 + (span - 1) / 2)  # 与 pandas 由 span 换算 com 再求 alpha 的方式一致
+    valid = ~np.isnan(x)
+    if n == 0:
+        return out
+    if x.ndim > 1:
+        return _ema_columns(x, valid, alpha, out)
+    if valid.all():
+        # 没有空值：每步的衰减与新值权重都相同
+        old_wt = 1.0 - alpha
+        out[0] = x[0]
+        np.multiply(x[1:], alpha / (old_wt + alpha), out=out[1:])
+        _linear_recurrence(out[1:], old_wt / (old_wt + alpha), x[0], out[1:])
+        return out
+
+    pos = np.flatnonzero(valid)
+    if len(pos) == 0:
+        out[:] = np.nan
+        return out
+
+    # 第 j 个有效值距上一个有效值隔了 gap 行：旧值权重 (1-alpha)^gap，新值权重 alpha
+    old_wt = (1.0 - alpha) ** np.diff(pos)
+    decay = old_wt / (old_wt + alpha)
+    b = x[pos[1:]] * (alpha / (old_wt + alpha))
+    values = np.empty(len(pos))
+    values[0] = x[pos[0]]
+    _linear_recurrence(b, decay, values[0], values[1:])
+
+    # 有效值写回原位置，中间的 NaN 行沿用上一个有效值
+    out[:pos[0]] = np.nan
+    last = np.maximum.accumulate(np.where(valid, np.arange(n), 0))
+    out[pos[0]:] = values[np.searchsorted(pos, last[pos[0]:])]
+    return out
+
+
+def fill_leading(x):
+    """
+    二维数组各列开头的空值用该列第一个有效值填充（常数序列的 EMA 不变），
+    返回 (填充后的数组, 开头空值的位置)；全为空值的列保持为空。
+    """
+    x = as_float64(x)
+    first = np.argmax(~np.isnan(x), axis=0)
+    leading = np.arange(len(x))[:, None] < first
+    return np.where(leading, x[first, np.arange(x.shape[1])], x), leading
+
+
+def _ema_columns(x, valid, alpha, out):
+    """各列开头的空值先填充，统一递推后再置回空值"""
+    first = np.argmax(valid, axis=0)
+    cols = np.arange(x.shape[1])
+    filled, leading = fill_leading(x)
+    old_wt = 1.0 - alpha
+    out[0] = filled[0]
+    np.multiply(filled[1:], alpha / (old_wt + alpha), out=out[1:])
+    _linear_recurrence(out[1:], old_wt / (old_wt + alpha), filled[0], out[1:])
+    out[leading] = np.nan
+    out[first, cols] = x[first, cols]  # 与一维相同，首个有效值原样保留（DIF 与 DEA 在首行相等）
+    return out
+
+
+def _ema_coefficients(span):
+    """adjust=False 递推 y[t] = decay * y[t-1] + weight * x[t] 的两个系数（与 ema 相同的算法）"""
+    alpha = 1.0 / (1.0 + (span - 1) / 2)
+    old_wt = 1.0 - alpha
+    return old_wt / (old_wt + alpha), alpha / (old_wt + alpha)
+
+
+def ema_weights(n, span, rows=1):
+    """
+    长度为 n 的无空值序列，ema(x, span) 最后 rows 行对 x 各行的权重（rows×n 矩阵），
+    即 ema(x, span)[-rows:] 与 weights @ x 在浮点误差范围内相同；x 可以是 日期×代码 二维数组。
+    """
+    decay, weight = _ema_coefficients(span)
+    out = np.zeros((rows, n))
+    for r, last in enumerate(range(n - rows, n)):
+        if last < 0:
+            out[r] = np.nan  # 序列不足 rows 行
+            continue
+        out[r, :last + 1] = weight * decay ** np.arange(last, -1, -1.0)
+        out[r, 0] = decay ** last  # 首行是递推初值
+    return out
+
+
+def _ema_adjoint(v, span):
+    """
+    ema 的转置：v 为对 ema(x) 各行的权重（rows×n），返回对 x 各行的权重，
+    即 v @ ema(x) 与 返回值 @ x 相同。按时间倒序递推 r[s] = v[s] + decay * r[s+1]。
+    """
+    decay, weight = _ema_coefficients(span)
+    rev = np.ascontiguousarray(v[:, ::-1].T)
+    _linear_recurrence(rev, decay, np.zeros(v.shape[0]), rev)
+    out = rev[::-1].T * weight
+    out[:, 0] /= weight  # 首行是递推初值，权重不乘 weight
+    return out
+
+
+def macd_tail(x, short_window, long_window, signal_window, rows=2):
+    """
+    只计算 DIF、DEA 的最后 rows 行（x 不能含空值，二维时各列开头的空值先用 fill_leading 填充）。
+    EMA 是线性递推，最后几行可以写成对整段收盘价的加权和，一次矩阵乘法算出所有股票，
+    不必逐行递推整段历史；结果与 ema 递推在浮点误差范围内相同。
+    """
+    x = as_float64(x)
+    n = len(x)
+    dif_w = ema_weights(n, short_window, rows) - ema_weights(n, long_window, rows)
+    dea_on_dif = ema_weights(n, signal_window, rows)
+    dea_w = _ema_adjoint(dea_on_dif, short_window) - _ema_adjoint(dea_on_dif, long_window)
+    values = np.vstack([dif_w, dea_w]) @ x
+    return values[:rows], values[rows:]
+
+
+def rsi_from_means(gain, loss, out=None):
+    """由平均涨幅/跌幅计算 RSI = 100 - 100 / (1 + gain / loss)（跌幅为 0 时为 100，二者都为 0 时为 NaN）"""
+    gain = as_float64(gain)
+    out = _out(out, gain.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(gain, loss, out=out)
+    out += 1.0
+    np.divide(100.0, out, out=out)
+    np.subtract(100.0, out, out=out)
+    return out
+
+
+def gain_loss(delta, period, gain_out=None, loss_out=None):
+    """
+    涨跌幅的滚动平均涨幅/跌幅（与 calc_RSI 一致：空值先剔除再滚动，结果放回原位置，空值处为 NaN）。
+    二维数组按列计算，每列只允许开头为空值（见 compact_columns）。
+    """
+    delta = as_float64(delta)
+    gain_out = _out(gain_out, delta.shape)
+    loss_out = _out(loss_out, delta.shape)
+    if delta.ndim > 1:
+        # np.maximum 保留空值，开头的空值不会进入任何完整窗口
+        rolling_mean(np.maximum(delta, 0.0), period, out=gain_out)
+        rolling_mean(np.maximum(-delta, 0.0), period, out=loss_out)
+        return gain_out, loss_out
+    valid = ~np.isnan(delta)
+    d = delta[valid]
+    gain_out[:] = np.nan
+    loss_out[:] = np.nan
+    gain_out[valid] = rolling_mean(np.maximum(d, 0.0), period)
+    loss_out[valid] = rolling_mean(np.maximum(-d, 0.0), period)
+    return gain_out, loss_out
+
+
+def rsi(close, period=14, out=None):
+    """相对强弱指数 RSI（与 logic_calc.calc_RSI 相同）"""
+    gain, loss = gain_loss(diff(close), period)
+    return rsi_from_means(gain, loss, out=out)
+
+
+def crossover(fast, slow, out=None):
+    """
+    交叉信号：1=上穿（前一行 fast<slow，当前 fast>slow），-1=下穿，0=无；含 NaN 的行视为无信号。
+    """
+    fast = as_float64(fast)
+    slow = as_float64(slow)
+    out = _out(out, fast.shape, np.int64)
+    above = fast > slow
+    below = fast < slow
+    out[:1] = 0
+    out[1:] = below[:-1] & above[1:]
+    out[1:] -= above[:-1] & below[1:]
+    return out
@@ -0,0 +1,87 @@
+import numpy as np
+
+from logic_batch import get_pool
+
+
+BOOTSTRAP_METHODS = ('stationary', 'block')
+BAND_PERCENTILES = (5, 25, 50, 75, 95)
+BAND_POINTS = 126  # 净值分位数带取样的时间点数（含最后一天），不必保存完整的 路径×时间 净值矩阵
+_CHUNK_BYTES = 8 * 1024 * 1024  # 每块路径的收益率矩阵不超过该大小，限制内存占用
+
+
+def bootstrap_indices(rng, paths, n, block, method='stationary'):
+    """
+    自助法重抽样的下标矩阵（paths×n），按块抽取以保留收益率的短期相关性，越过末尾时回到开头（循环）：
+    - block：固定长度 block 的块，起点均匀随机
+    - stationary：平稳自助法（Politis-Romano），每一步以 1/block 的概率开始新块，块长服从几何分布
+    返回的下标在 [0, 3n) 内，对应收益率首尾相接重复三次的序列（省去取模）。
+    """
+    t = np.arange(n)
+    if method == 'block':
+        starts = rng.integers(0, n, (paths, -(-n // block)))
+        # 块内偏移 t % block 加上块起点，减去块开始的时间 t - t % block，统一成 起点 - 块开始时间 + t
+        shift = starts - np.arange(0, n, block)
+        return np.repeat(shift, block, axis=1)[:, :n] + (t + n)
+    if method != 'stationary':
+        raise ValueError(f"未知的自助法：{method}")
+    # 块长直接按几何分布抽取（每条路径抽足够多块，最后一块兜底到 n），再按块长展开到每一步
+    count = 2 * (n // block) + 20
+    lengths = rng.geometric(1.0 / block, (paths, count))
+    lengths[:, -1] = n
+    ends = np.minimum(np.cumsum(lengths, axis=1), n)
+    begins = np.empty_like(ends)
+    begins[:, 0] = 0
+    begins[:, 1:] = ends[:, :-1]
+    shift = rng.integers(0, n, (paths, count)) - begins + n
+    out = np.repeat(shift.ravel(), (ends - begins).ravel()).reshape(paths, n)
+    out += t
+    return out
+
+
+def _simulate_chunk(returns, paths, block, method, seed, steps):
+    """一块路径：返回 (最终收益率, 最大回撤, 取样时间点上的净值)"""
+    rng = np.random.default_rng(seed)
+    equity = np.tile(returns, 3)[bootstrap_indices(rng, paths, len(returns), block, method)]
+    equity += 1.0
+    np.cumprod(equity, axis=1, out=equity)
+    final = equity[:, -1] - 1.0
+    sampled = equity[:, steps]
+    # 与 logic_backtest.grid_metrics 相同：回撤相对此前的最高净值
+    peak = np.maximum.accumulate(equity, axis=1)
+    np.divide(equity, peak, out=equity)
+    max_dd = equity.min(axis=1) - 1.0
+    return final, max_dd, sampled
+
+
+def monte_carlo(returns, paths=10_000, block=20, method='stationary', seed=0, processes=1):
+    """
+    策略逐日收益率的自助法蒙特卡洛模拟：按块生成 paths 条与原序列等长的路径（每块一个二维数组，内存有上限）。
+    返回 {final, max_dd}（每条路径一个值）与 bands（BAND_PERCENTILES × 取样时间点的净值分位数）、steps（取样时间点）。
+    各块的随机数种子由 seed 派生，单进程与多进程（processes > 1，使用共享进程池）结果相同。
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    returns = returns[~np.isnan(returns)]
+    n = len(returns)
+    if n == 0:
+        raise ValueError("没有可用于模拟的收益率")
+    block = max(1, min(int(block), n))
+    steps = np.unique(np.linspace(0, n - 1, min(BAND_POINTS, n)).round().astype(np.int64))
+
+    # 每块同时存在下标、收益率/净值与回撤中间结果等几个同样大小的矩阵，按三倍估算
+    chunk = max(1, _CHUNK_BYTES // (n * 8 * 3))
+    sizes = [min(chunk, paths - start) for start in range(0, paths, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(returns, size, block, method, child, steps) for size, child in zip(sizes, seeds)]
+    if processes <= 1 or len(jobs) <= 1:
+        results = [_simulate_chunk(*job) for job in jobs]
+    else:
+        pool = get_pool(processes)
+        results = [future.result() for future in [pool.submit(_simulate_chunk, *job) for job in jobs]]
+
+    final, max_dd, sampled = (np.concatenate(parts) for parts in zip(*results))
+    return {
+        'final': final,
+        'max_dd': max_dd,
+        'bands': np.percentile(sampled, BAND_PERCENTILES, axis=0),
+        'steps': steps,
+    }
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+import logic_kernels as kernels
+from logic_backtest import POSITIONS, TRADING_DAYS
+from logic_calc import IndicatorPipeline
+
+
+WEIGHTINGS = ('equal', 'inverse_vol')
+# 调仓周期：名称 -> pandas 周期代码（每个周期的第一个交易日调仓），'D' 为每日
+REBALANCE_FREQS = ('D', 'W', 'M', 'Q')
+VOL_WINDOW = 20  # 波动率倒数加权时估计波动率的交易日数
+
+
+def aligned_returns(closes):
+    """
+    日期×代码 收盘价宽表（各交易所休市日、上市前为 NaN）-> 对齐到全部日期的逐日收益率与可交易标记。
+    每只股票的收益率按自己的交易日计算（休市后第一天相对休市前最后收盘价），休市日与上市前收益为 0。
+    """
+    prices = closes.to_numpy(dtype=np.float64)
+    listed = np.maximum.accumulate(~np.isnan(prices), axis=0)
+    filled = closes.ffill().to_numpy(dtype=np.float64)
+    returns = np.zeros_like(filled)
+    with np.errstate(invalid='ignore'):
+        np.divide(filled[1:], filled[:-1], out=returns[1:])
+    returns[1:] -= 1.0
+    returns[np.isnan(returns)] = 0.0
+    return returns, listed
+
+
+def _own_days(values, order, mask):
+    """压缩空间（各股票自己的交易日）的结果放回日期×代码，休市日沿用上一个交易日的值"""
+    out = pd.DataFrame(kernels.expand_columns(values, order))
+    out[~mask] = np.nan
+    return out.ffill().to_numpy()
+
+
+def signal_matrix(closes, strategy, low=30, high=70):
+    """
+    一组股票的持仓信号（日期×代码，0/1）：strategy 为 logic_backtest.POSITIONS 中的内置策略，或 'hold'（始终持有）。
+    指标在压缩后的矩阵上一次计算（各股票按自己的交易日），休市日沿用上一个交易日的信号。
+    """
+    prices = closes.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(prices)
+    if strategy == 'hold':
+        return np.maximum.accumulate(valid, axis=0).astype(np.float64)
+    compact, order = kernels.compact_columns(prices)
+    pipeline = IndicatorPipeline(compact)
+    indicators = {name: pipeline.get(name) for name in ('RSI', 'DIF', 'DEA')}
+    position = POSITIONS[strategy](indicators, low, high).astype(np.float64)
+    return np.nan_to_num(_own_days(position, order, valid))
+
+
+def inverse_volatility(closes, window=VOL_WINDOW):
+    """各股票最近 window 个交易日收益率标准差的倒数（日期×代码），数据不足时为 NaN"""
+    prices = closes.to_numpy(dtype=np.float64)
+    compact, order = kernels.compact_columns(prices)
+    r = np.empty_like(compact)
+    r[:1] = np.nan
+    np.divide(compact[1:], compact[:-1], out=r[1:])
+    r[1:] -= 1.0
+    mean = kernels.rolling_mean(r, window)
+    mean_sq = kernels.rolling_mean(r * r, window)
+    var = np.maximum(mean_sq - mean * mean, 0.0) * (window / (window - 1))
+    with np.errstate(divide='ignore'):
+        inv = np.where(var > 0, 1.0 / np.sqrt(var), np.nan)
+    return _own_days(inv, order, ~np.isnan(prices))
+
+
+def target_weights(signals, weighting='equal', inv_vol=None):
+    """持仓信号 -> 目标权重（每行之和为 1，没有持仓信号时全部为现金）；inverse_vol 时按波动率倒数分配"""
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"未知的加权方式：{weighting}")
+    raw = signals if weighting == 'equal' else signals * np.nan_to_num(inv_vol)
+    total = raw.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, raw / total, 0.0)
+
+
+def rebalance_days(index, freq='M'):
+    """每个调仓周期的第一个交易日（首日总是调仓）"""
+    if freq == 'D':
+        return np.ones(len(index), dtype=bool)
+    periods = pd.DatetimeIndex(index).to_period(freq).asi8
+    days = np.ones(len(index), dtype=bool)
+    days[1:] = periods[1:] != periods[:-1]
+    return days
+
+
+def portfolio_backtest(returns, weights, rebalance, fee_bps=0.0):
+    """
+    组合回测（全部向量化，没有按股票或按日的循环）：returns 为 日期×代码 收益率，weights 为每天收盘时的目标权重，
+    rebalance 标记调仓日。调仓日收盘时把持仓调整为目标权重，两次调仓之间各股票按自己的收益率漂移，其余为现金（收益 0）。
+    两次调仓之间的持仓价值 = 调仓时权重 × 累计增长 G[t] / G[调仓日]，组合净值在调仓日之间依次累乘。
+    返回 {returns, equity, turnover, weights}：turnover 为调仓日买卖金额合计占组合净值的比例，
+    weights 为每天收盘（调仓后）的实际持仓权重；手续费按 fee_bps 乘以换手率在调仓日扣除。
+    """
+    n = len(returns)
+    growth = np.add(returns, 1.0)
+    np.cumprod(growth, axis=0, out=growth)
+    t = np.arange(n)
+    reb_pos = np.flatnonzero(rebalance)
+    # 每天的收益来自此前最近一次调仓时建立的持仓（调仓日当天的收益仍属于上一段）；首日之前没有持仓
+    last = np.maximum.accumulate(np.where(rebalance, t, -1))
+    prev = np.empty(n, dtype=np.int64)
+    prev[0] = -1
+    prev[1:] = last[:-1]
+    held = prev >= 0
+    base = np.where(held, prev, 0)
+
+    # 每单位调仓时净值对应的各股票持仓价值，其余为现金
+    drift = growth / growth[base]
+    drift *= weights[base]
+    drift[~held] = 0.0
+    cash = np.where(held, 1.0 - weights.sum(axis=1)[base], 1.0)
+    relative = drift.sum(axis=1) + cash  # 相对调仓时净值的组合价值
+
+    # 调仓前的实际权重（漂移后）与目标权重之差即为换手
+    actual = drift
+    actual /= relative[:, None]
+    turnover = np.zeros(n)
+    turnover[reb_pos] = np.abs(weights[reb_pos] - actual[reb_pos]).sum(axis=1)
+    actual[reb_pos] = weights[reb_pos]
+    cost = 1.0 - turnover * (fee_bps / 10_000.0)
+
+    # 调仓日净值 = 上一调仓日净值 × 本段增长 × (1 - 手续费)，沿调仓日累乘
+    value_at_reb = np.cumprod(relative[reb_pos] * cost[reb_pos])
+    start_value = np.ones(n)
+    start_value[held] = value_at_reb[np.searchsorted(reb_pos, prev[held])]
+    equity = start_value * relative * cost
+
+    daily = np.empty(n)
+    daily[0] = equity[0] - 1.0
+    np.divide(equity[1:], equity[:-1], out=daily[1:])
+    daily[1:] -= 1.0
+    return {'returns': daily, 'equity': equity, 'turnover': turnover, 'weights': actual}
+
+
+def run_portfolio(closes, strategy='hold', low=30, high=70, weighting='equal', freq='M',
+                  fee_bps=0.0, vol_window=VOL_WINDOW):
+    """
+    一篮子股票的组合回测：对每只股票应用同一策略得到持仓信号，按 weighting 分配权重、每 freq 调仓一次。
+    closes 为 日期×代码 收盘价宽表（不同交易所的休市日为 NaN）。
+    返回 (DataFrame[Return, Equity, Turnover], 每日实际权重 DataFrame)。
+    """
+    returns, listed = aligned_returns(closes)
+    signals = signal_matrix(closes, strategy, low, high) * listed
+    inv_vol = inverse_volatility(closes, vol_window) if weighting == 'inverse_vol' else None
+    weights = target_weights(signals, weighting, inv_vol)
+    result = portfolio_backtest(returns, weights, rebalance_days(closes.index, freq), fee_bps)
+    frame = pd.DataFrame({'Return': result['returns'], 'Equity': result['equity'],
+                          'Turnover': result['turnover']}, index=closes.index)
+    return frame, pd.DataFrame(result['weights'], index=closes.index, columns=closes.columns)
+
+
+def portfolio_stats(frame):
+    """组合的最终收益率、年化收益率、年化波动率、夏普比率、最大回撤与年化换手率"""
+    equity = frame['Equity']
+    returns = frame['Return']
+    years = max(len(frame) / TRADING_DAYS, 1e-9)
+    std = returns.std()
+    return {
+        'final': equity.iloc[-1] - 1.0,
+        'annual_return': equity.iloc[-1] ** (1.0 / years) - 1.0,
+        'volatility': std * np.sqrt(TRADING_DAYS),
+        'sharpe': returns.mean() / std * np.sqrt(TRADING_DAYS) if std > 0 else np.nan,
+        'max_dd': (equity / equity.cummax() - 1.0).min(),
+        'turnover': frame['Turnover'].sum() / years,
+    }
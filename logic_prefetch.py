@@ -0,0 +1,115 @@
+import threading
+import time
+
+from config import (
+    PRESET_CODES, WATCHLIST, CACHE_TTL, PREFETCH_ENABLED, PREFETCH_INTERVAL,
+    PREFETCH_PERIOD, PREFETCH_TOKEN_RESERVE
+)
+from logic_data import (
+    refresh_history, refresh_info, history_age, get_access_scores, get_warm_hit_stats
+)
+from logic_ratelimit import get_limiter_stats
+from logic_store import period_covers
+
+
+def prefetch_universe():
+    """需要预热的股票：PRESET_STOCKS 与 WATCHLIST 中的代码（去重，保持配置顺序）"""
+    return list(dict.fromkeys([*PRESET_CODES, *WATCHLIST]))
+
+
+class PrefetchScheduler(threading.Thread):
+    """
+    后台预取线程：按固定周期刷新常用股票的K线与公司信息，让交互请求尽量命中已预热的缓存。
+    每轮按请求热度（最近、最频繁的优先）排序，只刷新下一轮之前会过期的缓存；
+    限流令牌低于保留额度时本轮提前结束，把额度留给交互请求。
+    """
+
+    def __init__(self, symbols, period=PREFETCH_PERIOD, interval=PREFETCH_INTERVAL,
+                 token_reserve=PREFETCH_TOKEN_RESERVE):
+        super().__init__(name="prefetch-scheduler", daemon=True)
+        self.symbols = list(symbols)
+        self.period = period
+        self.interval = interval
+        self.token_reserve = token_reserve
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {"cycles": 0, "refreshed": 0, "skipped_fresh": 0,
+                      "deferred": 0, "errors": 0, "last_cycle": None}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def prioritized_symbols(self):
+        """按请求热度降序排列；从未被请求过的股票保持配置顺序排在后面"""
+        scores = get_access_scores()
+        order = {s: i for i, s in enumerate(self.symbols)}
+        candidates = self.symbols + [s for s in scores if s not in order]
+        return sorted(candidates, key=lambda s: (-scores.get(s, 0.0), order.get(s, len(order))))
+
+    def _due(self, symbol):
+        """缓存不存在、覆盖周期不足或会在下一轮之前过期时需要刷新"""
+        age = history_age(symbol)
+        if age is None:
+            return True
+        seconds, covered = age
+        return seconds > CACHE_TTL - self.interval or not period_covers(covered, self.period)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def snapshot_stats(self):
+        """统计的副本（加锁读取，供页面线程展示）"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def run_cycle(self):
+        for symbol in self.prioritized_symbols():
+            if self._stop_event.is_set():
+                break
+            if not self._due(symbol):
+                self._count("skipped_fresh")
+                continue
+            if get_limiter_stats()["tokens"] < self.token_reserve:
+                self._count("deferred")
+                break
+            try:
+                refresh_history(symbol, self.period)
+                refresh_info(symbol)
+                self._count("refreshed")
+            except Exception:
+                self._count("errors")
+        with self._stats_lock:
+            self.stats["cycles"] += 1
+            self.stats["last_cycle"] = time.time()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_cycle()
+            except Exception:
+                self._count("errors")
+            self._stop_event.wait(self.interval)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_prefetch():
+    """启动进程内唯一的后台预取线程（重复调用无副作用）；config.PREFETCH_ENABLED 关闭时不启动"""
+    global _scheduler
+    if not PREFETCH_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = PrefetchScheduler(prefetch_universe())
+            _scheduler.start()
+    return _scheduler
+
+
+def get_prefetch_stats():
+    """预取统计与交互请求的预热命中率"""
+    stats = _scheduler.snapshot_stats() if _scheduler is not None else {}
+    stats["warm_hit"] = get_warm_hit_stats()
+    return stats
@@ -0,0 +1,201 @@
+import os
+import time
+import zlib
+from abc import ABC, abstractmethod
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from config import (
+    DATA_PROVIDER, REPLAY_FIXTURE_DIR, REPLAY_END_DATE, REPLAY_MAX_BARS, REPLAY_LATENCY
+)
+from logic_store import slice_period
+
+
+# 财务报表种类与频率（yfinance 的属性名，季度报表带 quarterly_ 前缀）
+STATEMENTS = ('balance_sheet', 'income_stmt', 'cashflow')
+STATEMENT_FREQS = ('annual', 'quarterly')
+
+
+def _naive_daily_index(df):
+    """日线索引统一去掉时区（保留交易所当地日期），便于不同市场按日期对齐"""
+    if isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+        df = df.copy()
+        df.index = df.index.tz_localize(None)
+    return df
+
+
+def _filter_range(df, period=None, start=None):
+    """按 start（含当天）或 period 截取K线，与 yfinance 的 history 参数语义一致"""
+    if start is not None:
+        return df[df.index >= pd.Timestamp(start)]
+    return slice_period(df, period or '1mo')
+
+
+class MarketDataProvider(ABC):
+    """行情数据源接口：K线、公司信息、新闻、资产负债表（子类必须实现全部抽象方法）"""
+
+    name = "base"
+
+    @abstractmethod
+    def history(self, symbol, period=None, start=None):
+        """日线OHLCV（按 period 或 start 截取），索引为不带时区的日期"""
+
+    @abstractmethod
+    def info(self, symbol):
+        """公司基本信息字典"""
+
+    @abstractmethod
+    def news(self, symbol):
+        """最新新闻列表"""
+
+    @abstractmethod
+    def statement(self, symbol, kind, freq='annual'):
+        """财务报表（kind 见 STATEMENTS，freq 见 STATEMENT_FREQS），行为科目、列为报告期"""
+
+    def balance_sheet(self, symbol):
+        return self.statement(symbol, 'balance_sheet')
+
+    def closes(self, symbols, period):
+        """多只股票收盘价宽表（日期×代码）；默认逐只拉取后按日期对齐"""
+        frames = {s: self.history(s, period=period)["Close"] for s in symbols}
+        frames = {s: c for s, c in frames.items() if not c.empty}
+        return pd.DataFrame(frames)
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Yahoo Finance 数据源（线上默认）"""
+
+    name = "yfinance"
+
+    def history(self, symbol, period=None, start=None):
+        if start is not None:
+            df = yf.Ticker(symbol).history(start=start)
+        else:
+            df = yf.Ticker(symbol).history(period=period)
+        return _naive_daily_index(df)
+
+    def info(self, symbol):
+        return yf.Ticker(symbol).info or {}  # 确保info是字典（原始注释保留）
+
+    def news(self, symbol):
+        return yf.Ticker(symbol).news or []  # 确保news是列表（原始注释保留）
+
+    def statement(self, symbol, kind, freq='annual'):
+        attr = kind if freq == 'annual' else f"quarterly_{kind}"
+        return getattr(yf.Ticker(symbol), attr)
+
+    def closes(self, symbols, period):
+        """一次批量下载多只股票，只保留收盘价"""
+        raw = yf.download(list(symbols), period=period, group_by="column",
+                          progress=False, threads=True)
+        if raw.empty:
+            return pd.DataFrame()
+        closes = raw["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(symbols[0])
+        return _naive_daily_index(closes)
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    离线数据源：优先回放 fixture 目录中的 Parquet/CSV（文件名为转义后的股票代码），
+    没有 fixture 时按股票代码生成确定性的合成K线，用于压测和离线基准测试。
+    """
+
+    name = "replay"
+
+    def __init__(self, fixture_dir=REPLAY_FIXTURE_DIR, end_date=REPLAY_END_DATE,
+                 max_bars=REPLAY_MAX_BARS, latency=REPLAY_LATENCY):
+        self.fixture_dir = fixture_dir
+        self.end_date = end_date
+        self.max_bars = max_bars
+        self.latency = latency  # 模拟网络延迟（秒）
+        self._bars = {}
+
+    def _fixture_path(self, symbol, suffix=""):
+        if not self.fixture_dir:
+            return None
+        stem = os.path.join(self.fixture_dir, quote(symbol, safe='') + suffix)
+        for ext in ('.parquet', '.csv'):
+            if os.path.exists(stem + ext):
+                return stem + ext
+        return None
+
+    @staticmethod
+    def _read(path):
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        return pd.read_csv(path, index_col=0, parse_dates=True)
+
+    def _seed(self, symbol):
+        return zlib.crc32(symbol.encode('utf-8'))
+
+    def _synthetic_bars(self, symbol):
+        """几何布朗运动生成的合成日线（同一代码每次结果相同）"""
+        rng = np.random.default_rng(self._seed(symbol))
+        index = pd.bdate_range(end=self.end_date, periods=self.max_bars, name='Date')
+        n = len(index)
+        drift, vol = rng.uniform(-0.0002, 0.0006), rng.uniform(0.01, 0.03)
+        close = rng.uniform(20, 500) * np.exp(np.cumsum(rng.normal(drift, vol, n)))
+        open_ = close * np.exp(rng.normal(0, vol / 3, n))
+        spread = np.abs(rng.normal(0, vol / 2, n))
+        return pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + spread),
+            'Low': np.minimum(open_, close) * (1 - spread),
+            'Close': close,
+            'Volume': rng.integers(100_000, 10_000_000, n),
+            'Dividends': 0.0,
+            'Stock Splits': 0.0,
+        }, index=index)
+
+    def _all_bars(self, symbol):
+        if symbol not in self._bars:
+            path = self._fixture_path(symbol)
+            bars = self._read(path) if path else self._synthetic_bars(symbol)
+            self._bars[symbol] = _naive_daily_index(bars).sort_index()
+        return self._bars[symbol]
+
+    def history(self, symbol, period=None, start=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return _filter_range(self._all_bars(symbol), period, start)
+
+    def info(self, symbol):
+        bars = self._all_bars(symbol)
+        return {
+            'shortName': symbol,
+            'symbol': symbol,
+            'currentPrice': float(bars['Close'].iloc[-1]),
+            'sector': '离线回放',
+            'industry': '合成数据' if self._fixture_path(symbol) is None else '回放数据',
+        }
+
+    def news(self, symbol):
+        return []
+
+    def statement(self, symbol, kind, freq='annual'):
+        # fixture 文件名后缀：年度为 _balance_sheet，季度为 _quarterly_balance_sheet
+        suffix = f"_{kind}" if freq == 'annual' else f"_quarterly_{kind}"
+        path = self._fixture_path(symbol, suffix)
+        return self._read(path) if path else pd.DataFrame()
+
+
+_PROVIDERS = {
+    YFinanceProvider.name: YFinanceProvider,
+    ReplayProvider.name: ReplayProvider,
+}
+_provider = None
+
+
+def get_provider():
+    """返回 config.DATA_PROVIDER 指定的数据源（进程内单例）"""
+    global _provider
+    if _provider is None:
+        if DATA_PROVIDER not in _PROVIDERS:
+            raise ValueError(f"未知的数据源：{DATA_PROVIDER}（可选：{list(_PROVIDERS)}）")
+        _provider = _PROVIDERS[DATA_PROVIDER]()
+    return _provider
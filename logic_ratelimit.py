@@ -0,0 +1,199 @@
+import threading
+import time
+
+from config import (
+    RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST, RATE_LIMIT_MAX_WAIT,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN
+)
+from logic_cache import SWRCache, is_empty_result
+
+
+class UpstreamUnavailable(Exception):
+    """上游暂不可用（令牌耗尽或熔断打开）且没有可回退的历史数据"""
+
+
+def is_rate_limit_error(e):
+    """判断异常是否为上游限流（HTTP 429）"""
+    return "429" in str(e) or "Too Many Requests" in str(e) or "Rate limited" in str(e)
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 capacity 个（允许短时突发）"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, max_wait=0.0):
+        """
+        尝试取一个令牌。令牌不足时最多等待 max_wait 秒（默认不等待），
+        等不到直接返回 False，由调用方决定回退，而不是在脚本线程里反复 sleep 重试。
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            wait = (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return False
+            # 预占令牌后在锁外等待，其他会话不会抢走这个令牌
+            self._tokens -= 1
+        time.sleep(wait)
+        return True
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续 failure_threshold 次限流后打开，cooldown 秒内不再请求上游；
+    冷却结束后放行一次试探请求（半开），成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold, cooldown, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """是否允许本次请求访问上游"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True  # 半开状态只放行一个试探请求
+            return True
+
+    def release_probe(self):
+        """试探请求没有真正访问上游（被限速或被中断）时交还试探资格，下一个请求可以重新试探"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+
+class UpstreamLimiter:
+    """进程级上游请求闸门：令牌桶限速 + 熔断 + 最近一次成功结果回退"""
+
+    def __init__(self, bucket, breaker, max_wait=0.0):
+        self.bucket = bucket
+        self.breaker = breaker
+        self.max_wait = max_wait
+        # 最近一次成功结果同样计入内存预算，长期不用的会被 LRU 淘汰
+        self._last_good = SWRCache("last_good", ttl=float("inf"), swr=False)
+        self._lock = threading.Lock()
+        self.stats = {"issued": 0, "throttled": 0, "short_circuited": 0,
+                      "rate_limited": 0, "served_last_good": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _last_good_value(self, key):
+        entry = self._last_good.peek(key)
+        if entry is None:
+            return None
+        self._count("served_last_good")
+        return entry
+
+    def _fallback(self, key, reason):
+        entry = self._last_good_value(key)
+        if entry is not None:
+            return entry.value
+        raise UpstreamUnavailable(reason)
+
+    def call(self, key, fetch):
+        """
+        通过闸门调用上游 fetch()。熔断打开或令牌不足时返回 key 对应的最近一次成功结果，
+        没有则抛出 UpstreamUnavailable；上游返回空结果时同样优先回退到最近一次成功结果。
+        """
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            return self._fallback(key, "上游请求过于频繁，已暂停请求，请稍后再试")
+        if not self.bucket.try_acquire(self.max_wait):
+            # 半开时放行的试探请求没有发出，交还试探资格，否则熔断器会一直拦截
+            self.breaker.release_probe()
+            self._count("throttled")
+            return self._fallback(key, "请求额度已用完，请稍后再试")
+
+        self._count("issued")
+        try:
+            value = fetch()
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self._count("rate_limited")
+                self.breaker.record_failure()
+                return self._fallback(key, f"请求过于频繁，请稍后再试。错误详情：{str(e)}")
+            self.breaker.record_success()  # 非限流错误说明上游可达
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            # KeyboardInterrupt 等 BaseException 也不能让试探状态残留
+            self.breaker.release_probe()
+
+        if is_empty_result(value):
+            entry = self._last_good_value(key)
+            return entry.value if entry is not None else value
+        self._last_good.put(key, value)
+        return value
+
+
+# 进程内所有会话共享同一个闸门
+_limiter = UpstreamLimiter(
+    TokenBucket(RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST),
+    CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN),
+    max_wait=RATE_LIMIT_MAX_WAIT,
+)
+
+
+def limited_call(key, fetch):
+    """所有上游行情请求的统一入口，key 用于回退时查找最近一次成功结果"""
+    return _limiter.call(key, fetch)
+
+
+def get_limiter_stats():
+    """返回闸门统计（已发出/被限速/熔断拦截/上游429/回退次数、熔断状态、剩余令牌）"""
+    stats = dict(_limiter.stats)
+    stats["circuit_state"] = _limiter.breaker.state
+    stats["tokens"] = round(_limiter.bucket.tokens, 2)
+    return stats
@@ -0,0 +1,261 @@
+import ast
+from functools import lru_cache
+
+import numpy as np
+
+import logic_kernels as kernels
+from logic_calc import DEFAULT_PARAMS, IndicatorPipeline
+
+
+class RuleError(ValueError):
+    """规则表达式无法解析、含不支持的语法/指标或类型不匹配"""
+
+
+# 可用指标：名称 -> (参数名, 对应 DEFAULT_PARAMS 中的键)；参数省略时取默认值
+_INDICATORS = {
+    'SMA': ('sma_window',),
+    'EMA': ('ema_span',),
+    'RSI': ('rsi_period',),
+    'MACD': ('macd_short', 'macd_long'),
+    'MACD_SIGNAL': ('macd_short', 'macd_long', 'macd_signal'),
+    'MACD_HIST': ('macd_short', 'macd_long', 'macd_signal'),
+}
+_ALIASES = {'DIF': 'MACD', 'DEA': 'MACD_SIGNAL', 'MACD_BAR': 'MACD_HIST'}
+_PRICES = {'CLOSE': 'Close', 'OPEN': 'Open', 'HIGH': 'High', 'LOW': 'Low', 'VOLUME': 'Volume'}
+# 指标在计算图（logic_calc）中的节点名
+_PIPELINE_NODES = {'SMA': 'SMA_50', 'RSI': 'RSI', 'MACD': 'DIF', 'MACD_SIGNAL': 'DEA', 'MACD_HIST': 'MACD_BAR'}
+# 参数均为默认值时，K线上已有的指标列（如 get_indicator_frame 的共享结果）可以直接使用
+_CACHED_COLUMNS = {
+    ('SMA', (DEFAULT_PARAMS['sma_window'],)): 'SMA_50',
+    ('RSI', (DEFAULT_PARAMS['rsi_period'],)): 'RSI',
+    ('MACD', (DEFAULT_PARAMS['macd_short'], DEFAULT_PARAMS['macd_long'])): 'DIF',
+    ('MACD_SIGNAL', (DEFAULT_PARAMS['macd_short'], DEFAULT_PARAMS['macd_long'],
+                     DEFAULT_PARAMS['macd_signal'])): 'DEA',
+    ('MACD_HIST', (DEFAULT_PARAMS['macd_short'], DEFAULT_PARAMS['macd_long'],
+                   DEFAULT_PARAMS['macd_signal'])): 'MACD_BAR',
+}
+_CROSSES = {'CROSS_UP': 1, 'CROSS_DOWN': -1}
+
+_COMPARE_OPS = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+_FLIPPED = {'>': '<', '>=': '<='}  # a > b 统一写成 b < a
+_ARITH_OPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+_COMMUTATIVE = {'and', 'or', '+', '*', '==', '!='}
+
+_NUMPY_OPS = {
+    '<': np.less, '<=': np.less_equal, '==': np.equal, '!=': np.not_equal,
+    '+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide,
+}
+
+RULE_HELP = (
+    "可用指标：CLOSE/OPEN/HIGH/LOW/VOLUME、SMA(50)、EMA(n)、RSI(14)、MACD(12,26)（即 DIF）、"
+    "MACD_SIGNAL(12,26,9)（即 DEA）、MACD_HIST(12,26,9)；参数可省略。"
+    "条件可用 < <= > >= == != 比较，and / or / not 组合，CROSS_UP(a, b) / CROSS_DOWN(a, b) 表示上穿/下穿。"
+)
+
+
+class _Compiler:
+    """
+    把表达式的语法树转为规范化的节点（可哈希的元组）：参数补全默认值、别名统一、
+    可交换运算的操作数排序，写法不同但含义相同的子表达式得到同一个节点，只计算一次。
+    """
+
+    def __init__(self):
+        self.steps = []  # 按依赖顺序排列的节点
+        self.kinds = {}  # 节点 -> 'num'（数值序列）或 'bool'（条件）
+
+    def _add(self, key, kind):
+        if key not in self.kinds:
+            self.kinds[key] = kind
+            self.steps.append(key)
+        return key
+
+    def _expect(self, key, kind, what):
+        if self.kinds[key] != kind:
+            expected = "条件表达式" if kind == 'bool' else "数值"
+            raise RuleError(f"{what}的操作数必须是{expected}")
+        return key
+
+    def compile(self, node):
+        if isinstance(node, ast.BoolOp):
+            op = 'and' if isinstance(node.op, ast.And) else 'or'
+            operands = {self._expect(self.compile(v), 'bool', op) for v in node.values}
+            return self._add((op,) + tuple(sorted(operands, key=repr)), 'bool')
+        if isinstance(node, ast.UnaryOp):
+            operand = self.compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return self._add(('not', self._expect(operand, 'bool', 'not ')), 'bool')
+            if isinstance(node.op, ast.USub):
+                if operand[0] == 'const':
+                    return self._add(('const', -operand[1]), 'num')
+                zero = self._add(('const', 0.0), 'num')
+                return self._add(('-', zero, self._expect(operand, 'num', '负号')), 'num')
+            if isinstance(node.op, ast.UAdd):
+                return self._expect(operand, 'num', '正号')
+        if isinstance(node, ast.Compare):
+            left = self._expect(self.compile(node.left), 'num', '比较')
+            parts = []
+            for op, comparator in zip(node.ops, node.comparators):
+                if type(op) not in _COMPARE_OPS:
+                    raise RuleError(f"不支持的比较运算：{type(op).__name__}")
+                right = self._expect(self.compile(comparator), 'num', '比较')
+                parts.append(self._binary(_COMPARE_OPS[type(op)], left, right, 'bool'))
+                left = right
+            if len(parts) == 1:
+                return parts[0]
+            return self._add(('and',) + tuple(sorted(set(parts), key=repr)), 'bool')  # 链式比较 a < b < c
+        if isinstance(node, ast.BinOp):
+            if type(node.op) not in _ARITH_OPS:
+                raise RuleError(f"不支持的运算：{type(node.op).__name__}")
+            left = self._expect(self.compile(node.left), 'num', '算术运算')
+            right = self._expect(self.compile(node.right), 'num', '算术运算')
+            return self._binary(_ARITH_OPS[type(node.op)], left, right, 'num')
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            return self._add(('const', float(node.value)), 'num')
+        if isinstance(node, ast.Name):
+            return self._indicator(node.id, [])
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            name = node.func.id.upper()
+            if name in _CROSSES:
+                if len(node.args) != 2:
+                    raise RuleError(f"{name} 需要两个参数")
+                fast, slow = (self._expect(self.compile(a), 'num', name) for a in node.args)
+                return self._add(('cross', _CROSSES[name], fast, slow), 'bool')
+            return self._indicator(node.func.id, node.args)
+        raise RuleError(f"不支持的语法：{type(node).__name__}")
+
+    def _binary(self, op, left, right, kind):
+        if op in _FLIPPED:
+            op, left, right = _FLIPPED[op], right, left
+        if op in _COMMUTATIVE:
+            left, right = sorted((left, right), key=repr)
+        return self._add((op, left, right), kind)
+
+    def _indicator(self, raw_name, args):
+        name = _ALIASES.get(raw_name.upper(), raw_name.upper())
+        if name in _PRICES:
+            if args:
+                raise RuleError(f"{name} 不接受参数")
+            return self._add(('price', _PRICES[name]), 'num')
+        if name not in _INDICATORS:
+            raise RuleError(f"未知指标：{raw_name}")
+        param_names = _INDICATORS[name]
+        if len(args) > len(param_names):
+            raise RuleError(f"{name} 最多接受 {len(param_names)} 个参数")
+        values = []
+        for i, param in enumerate(param_names):
+            if i < len(args):
+                arg = args[i]
+                if not (isinstance(arg, ast.Constant) and isinstance(arg.value, int)
+                        and not isinstance(arg.value, bool) and arg.value > 0):
+                    raise RuleError(f"{name} 的参数必须是正整数")
+                values.append(arg.value)
+            elif param in DEFAULT_PARAMS:
+                values.append(DEFAULT_PARAMS[param])
+            else:
+                raise RuleError(f"{name} 需要指定参数，如 {name}(20)")
+        return self._add(('ind', name, tuple(values)), 'num')
+
+
+class RulePlan:
+    """
+    一组已编译的规则：所有规则的节点合并去重后按依赖顺序排列，一次计算完成；
+    指标节点优先读取K线上已有的指标列，其余用 logic_calc 的计算图按参数分组计算（同组共享中间结果）。
+    """
+
+    def __init__(self, outputs, steps, kinds):
+        self.outputs = outputs  # 规则名 -> 节点
+        self.steps = steps
+        self.kinds = kinds
+
+    def evaluate(self, df):
+        """在一段K线（至少含 Close 列）上向量化计算全部规则，返回 {规则名: 与K线等长的数组}（条件为 bool）"""
+        values = {}
+        pipelines = {}
+        try:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for key in self.steps:
+                    values[key] = self._step(key, values, df, pipelines)
+        except RuleError:
+            raise
+        except (ValueError, TypeError, KeyError, IndexError, ArithmeticError) as e:
+            raise RuleError(f"规则计算失败：{e}") from e
+        results = {name: values[key] for name, key in self.outputs.items()}
+        for name, value in results.items():
+            if np.shape(value) != (len(df),):
+                raise RuleError(f"规则 {name} 的结果长度与K线不一致")
+        return results
+
+    def _step(self, key, values, df, pipelines):
+        op = key[0]
+        if op == 'const':
+            # 常数展开为与K线等长的序列，与指标序列的运算结果形状一致（如 'RSI < 30 or 1 < 2'）
+            return np.full(len(df), key[1])
+        if op == 'price':
+            if key[1] not in df.columns:
+                raise RuleError(f"K线中没有 {key[1]} 列")
+            return kernels.as_float64(df[key[1]].to_numpy())
+        if op == 'ind':
+            return self._indicator(key[1], key[2], df, pipelines)
+        if op == 'and':
+            return np.logical_and.reduce([values[k] for k in key[1:]])
+        if op == 'or':
+            return np.logical_or.reduce([values[k] for k in key[1:]])
+        if op == 'not':
+            return np.logical_not(values[key[1]])
+        if op == 'cross':
+            return kernels.crossover(values[key[2]], values[key[3]]) == key[1]
+        return _NUMPY_OPS[op](values[key[1]], values[key[2]])
+
+    @staticmethod
+    def _indicator(name, params, df, pipelines):
+        column = _CACHED_COLUMNS.get((name, params))
+        if column is not None and column in df.columns:
+            return kernels.as_float64(df[column].to_numpy())
+        close = df['Close'].to_numpy()
+        if name == 'EMA':
+            return kernels.ema(close, params[0])
+        overrides = dict(zip(_INDICATORS[name], params))
+        group = tuple(sorted({**DEFAULT_PARAMS, **overrides}.items()))
+        if group not in pipelines:
+            pipelines[group] = IndicatorPipeline(close, **dict(group))
+        return pipelines[group].get(_PIPELINE_NODES[name])
+
+
+def _parse(text):
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        where = f"（第 {e.offset} 个字符附近）" if e.offset else ""
+        raise RuleError(f"规则语法错误：{e.msg}{where}") from None
+    return tree.body
+
+
+@lru_cache(maxsize=256)
+def _compile(items, conditions_only):
+    compiler = _Compiler()
+    outputs = {}
+    for name, text in items:
+        key = compiler.compile(_parse(text))
+        if conditions_only and compiler.kinds[key] != 'bool':
+            raise RuleError(f"规则 {name} 不是条件表达式（需要比较，如 RSI(14) < 30）")
+        outputs[name] = key
+    return RulePlan(outputs, list(compiler.steps), dict(compiler.kinds))
+
+
+def compile_rules(rules, conditions_only=False):
+    """
+    编译一组规则 {名称: 表达式}（相同文本只解析一次），返回 RulePlan；
+    规则之间相同的子表达式只计算一次。conditions_only=True 时每条规则都必须是条件表达式。
+    """
+    return _compile(tuple(rules.items()), conditions_only)
+
+
+def compile_rule(text):
+    """编译单条条件规则，如 'RSI(14) < 30 and MACD > MACD_SIGNAL'"""
+    return compile_rules({'rule': text}, conditions_only=True)
+
+
+def evaluate_rule(text, df):
+    """在K线上计算单条条件规则，返回 bool 数组"""
+    return compile_rule(text).evaluate(df)['rule']
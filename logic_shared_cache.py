@@ -0,0 +1,146 @@
+import contextlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from config import SHARED_CACHE_PATH, SHARED_CACHE_LEASE
+from logic_cache import is_empty_result
+
+
+_MISSING = object()
+
+
+class SharedCache:
+    """
+    跨进程共享缓存（本地 SQLite 文件）：多个 Streamlit 进程共用一份已下载数据。
+    每条记录带过期时间，写入在事务内完成（原子）；lock() 基于租约表实现跨进程互斥，
+    保证同一 key 只有一个进程访问上游，其余进程等待后直接读取结果。
+    """
+
+    def __init__(self, path, lease_seconds=30.0, poll_interval=0.1):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "lock_waits": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache "
+                         "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases "
+                         "(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _conn(self):
+        # sqlite3 连接不能跨线程共享，每个线程各自持有一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE 事务：立即拿到写锁，其他进程的写入会等待（SQLite 自带文件锁）"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value, expires FROM cache WHERE key = ?", (repr(key),)).fetchone()
+        if row is None or row[1] < time.time():
+            self.stats["misses"] += 1
+            return default
+        self.stats["hits"] += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                         (repr(key), blob, now + ttl))
+            conn.execute("DELETE FROM cache WHERE expires < ?", (now,))
+        self.stats["writes"] += 1
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """跨进程互斥锁（租约）：持有者崩溃时租约到期后自动失效，其他进程可接管"""
+        key_str = repr(key)
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        waited = False
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                row = conn.execute("SELECT owner, expires FROM leases WHERE key = ?",
+                                   (key_str,)).fetchone()
+                if row is None or row[1] < now or row[0] == owner:
+                    conn.execute("INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                                 (key_str, owner, now + self.lease_seconds))
+                    break
+            if not waited:
+                self.stats["lock_waits"] += 1
+                waited = True
+            time.sleep(self.poll_interval)
+        try:
+            yield
+        finally:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key_str, owner))
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """返回跨进程共享缓存；config.SHARED_CACHE_PATH 为空时关闭（返回 None）"""
+    global _shared_cache
+    if not SHARED_CACHE_PATH:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedCache(SHARED_CACHE_PATH, lease_seconds=SHARED_CACHE_LEASE)
+    return _shared_cache
+
+
+def shared_lock(key):
+    """跨进程互斥；共享缓存关闭时为空操作"""
+    cache = get_shared_cache()
+    return cache.lock(key) if cache is not None else contextlib.nullcontext()
+
+
+def shared_fetch(key, fetch, ttl):
+    """
+    先查跨进程共享缓存，未命中时加跨进程锁再查一次，仍未命中才调用 fetch() 并写回。
+    共享缓存关闭或 ttl 为 None 时直接调用 fetch()；空结果不写入。
+    """
+    cache = get_shared_cache()
+    if cache is None or ttl is None:
+        return fetch()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    with cache.lock(key):
+        # 等锁期间其他进程可能已写入
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = fetch()
+        if not is_empty_result(value):
+            cache.set(key, value, ttl)
+        return value
+
+
+def get_shared_cache_stats():
+    cache = get_shared_cache()
+    return dict(cache.stats) if cache is not None else {}
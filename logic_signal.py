@@ -1,89 +1,122 @@
+import numpy as np
+import pandas as pd
+
+import logic_kernels as kernels
+from logic_calc import DEFAULT_PARAMS
+
+
+# 信号代码：正数偏多、负数偏空，数值越大越强
+STRONG_BUY, BUY, HOLD, SELL, STRONG_SELL = 2, 1, 0, -1, -2
+
+SIGNAL_LABELS = {
+    STRONG_BUY: ("🟢", "STRONG BUY (强烈买入)"),
+    BUY: ("🟣", "BUY (买入)"),
+    HOLD: ("🟡", "HOLD (观望)"),
+    SELL: ("🟠", "SELL (卖出)"),
+    STRONG_SELL: ("🔴", "STRONG SELL (强烈卖出)"),
+}
+
+# RSI 区间代码对应的判断依据（与信号代码同号：2=重度超卖 … -2=重度超买）
+_RSI_REASONS = {
+    STRONG_SELL: "RSI = {rsi} > 75（重度超买）",
+    SELL: "RSI = {rsi} > 70（轻度超买）",
+    STRONG_BUY: "RSI = {rsi} < 25（重度超卖）",
+    BUY: "RSI = {rsi} < 30（轻度超卖）",
+    HOLD: "RSI = {rsi}（正常区间，30≤RSI≤70）",
+}
+_MACD_REASONS = {
+    1: "MACD金叉（DIF={dif} 上穿DEA={dea}）",
+    -1: "MACD死叉（DIF={dif} 下穿DEA={dea}）",
+}
+
+SIGNAL_COLUMNS = ('Signal', 'RSI_Zone', 'MACD_Signal')
+
+
+def signal_codes(rsi, dif, dea):
+    """
+    向量化计算每根K线的信号代码（支持一维序列，或按列计算的 日期×代码 二维数组），返回
+    (Signal, RSI_Zone, MACD_Signal) 三个 int8 数组：
+    RSI > 75 / > 70 / < 25 / < 30 分别为强烈卖出 / 卖出 / 强烈买入 / 买入，其余（含 NaN）为观望；
+    RSI 观望时 MACD 金叉/死叉给出买入/卖出，与 RSI 同向时作为附加依据，反向时忽略。
+    MACD_Signal 只记录参与判断的交叉（1=金叉，-1=死叉）。
+    """
+    rsi = kernels.as_float64(rsi)
+    zone = np.select([rsi > 75, rsi > 70, rsi < 25, rsi < 30],
+                     [STRONG_SELL, SELL, STRONG_BUY, BUY], HOLD).astype(np.int8)
+    cross = kernels.crossover(dif, dea).astype(np.int8)
+    macd = np.where(zone * cross >= 0, cross, 0).astype(np.int8)
+    signal = np.where(zone != HOLD, zone, macd).astype(np.int8)
+    return signal, zone, macd
+
+
+def calc_signals(df):
+    """整段K线的信号代码（需已有 RSI/DIF/DEA 列），返回与 df 同索引的 Signal/RSI_Zone/MACD_Signal 三列"""
+    codes = signal_codes(df['RSI'].to_numpy(), df['DIF'].to_numpy(), df['DEA'].to_numpy())
+    return pd.DataFrame(dict(zip(SIGNAL_COLUMNS, codes)), index=df.index)
+
+
+def describe_signal(signal, rsi_zone, macd_signal, rsi, dif, dea, has_prev=True):
+    """把信号代码渲染为 (图标, 状态, 判断依据)，只在展示时调用"""
+    icon, status = SIGNAL_LABELS[int(signal)]
+    reason = _RSI_REASONS[int(rsi_zone)].format(rsi=f"{rsi:.1f}")
+    if not has_prev:
+        return icon, status, reason + "（数据不足，无法判断MACD交叉）"
+    if macd_signal:
+        macd_reason = _MACD_REASONS[int(macd_signal)].format(dif=f"{dif:.2f}", dea=f"{dea:.2f}")
+        reason = f"{reason} + {macd_reason}" if rsi_zone else macd_reason
+    return icon, status, reason
+
+
 def get_investment_signal(df):
     try:
-        signal_icon = "⚪"
-        status = "无法判断"
-        signal_reason = "数据不足，无法判断信号（需至少2行有效数据）"
-
         # ========== 关键修改：对齐实际列名 =========
         required_cols = ["RSI", "DIF", "DEA"]  # 替换为实际列名
         if not all(col in df.columns for col in required_cols):
             missing_cols = [col for col in required_cols if col not in df.columns]
             signal_reason = f"缺少关键指标列：{missing_cols}（实际列名：RSI/DIF/DEA）"
-            return signal_icon, status, signal_reason
+            return "⚪", "无法判断", signal_reason
 
         if len(df) < 1:
-            return signal_icon, status, signal_reason
-
-        # 重置为观望状态
-        signal_icon = "🟡"
-        status = "HOLD (观望)"
-        signal_reason = ""
-
-        # ========== 1. RSI 判断（列名一致，无需改） ==========
-        rsi_value = df['RSI'].iloc[-1]
-        try:
-            rsi_str = f"{rsi_value:.1f}"
-        except:
-            rsi_str = "N/A"
-            signal_reason = "RSI值格式错误"
-            return signal_icon, status, signal_reason
-        
-        if rsi_value > 75:
-            status = "STRONG SELL (强烈卖出)"
-            signal_icon = "🔴"
-            signal_reason = f"RSI = {rsi_str} > 75（重度超买）"
-        elif rsi_value > 70:
-            status = "SELL (卖出)"
-            signal_icon = "🟠"
-            signal_reason = f"RSI = {rsi_str} > 70（轻度超买）"
-        elif rsi_value < 25:
-            status = "STRONG BUY (强烈买入)"
-            signal_icon = "🟢"
-            signal_reason = f"RSI = {rsi_str} < 25（重度超卖）"
-        elif rsi_value < 30:
-            status = "BUY (买入)"
-            signal_icon = "🟣"
-            signal_reason = f"RSI = {rsi_str} < 30（轻度超卖）"
-        else:
-            signal_reason = f"RSI = {rsi_str}（正常区间，30≤RSI≤70）"
-
-        # ========== 2. MACD 交叉判断（替换列名：MACD→DIF，Signal_Line→DEA） ==========
-        if len(df) >= 2:
-            # 最新值（DIF对应原MACD，DEA对应原Signal_Line）
-            dif_line = df['DIF'].iloc[-1]
-            dea_line = df['DEA'].iloc[-1]
-            try:
-                dif_str = f"{dif_line:.2f}"
-                dea_str = f"{dea_line:.2f}"
-            except:
-                signal_reason += "（MACD值格式错误）"
-                return signal_icon, status, signal_reason
-            
-            # 前一日值
-            prev_dif = df['DIF'].iloc[-2]
-            prev_dea = df['DEA'].iloc[-2]
-
-            # MACD金叉（DIF上穿DEA）
-            if (prev_dif < prev_dea) and (dif_line > dea_line):
-                macd_reason = f"MACD金叉（DIF={dif_str} 上穿DEA={dea_str}）"
-                if "BUY" in status:
-                    signal_reason += f" + {macd_reason}"
-                elif "SELL" not in status:
-                    status = "BUY (买入)"
-                    signal_icon = "🟣"
-                    signal_reason = macd_reason
-            # MACD死叉（DIF下穿DEA）
-            elif (prev_dif > prev_dea) and (dif_line < dea_line):
-                macd_reason = f"MACD死叉（DIF={dif_str} 下穿DEA={dea_str}）"
-                if "SELL" in status:
-                    signal_reason += f" + {macd_reason}"
-                elif "BUY" not in status:
-                    status = "SELL (卖出)"
-                    signal_icon = "🟠"
-                    signal_reason = macd_reason
-        else:
-            signal_reason += "（数据不足，无法判断MACD交叉）"
-
-        return signal_icon, status, signal_reason
+            return "⚪", "无法判断", "数据不足，无法判断信号（需至少2行有效数据）"
+
+        # 只需最后两行即可判断当前信号（前一行用于判断 MACD 交叉）
+        tail = df[required_cols].iloc[-2:]
+        codes = calc_signals(tail).iloc[-1]
+        rsi, dif, dea = tail.iloc[-1]
+        return describe_signal(*codes, rsi, dif, dea, has_prev=len(tail) >= 2)
     except Exception as e:
         return "❌", "错误", f"信号计算失败：{str(e)}"
+
+
+def universe_signals(closes, **params):
+    """
+    一次计算整个股票池的当前信号：closes 为 日期×代码 收盘价宽表（各股票上市日期、休市日可不同）。
+    每只股票按自己的交易日序列取最新一根K线，返回以代码为索引的 Signal/RSI_Zone/MACD_Signal/RSI/DIF/DEA/Date，
+    按信号从强烈买入到强烈卖出排序，同档内 RSI 低者在前；没有任何数据的股票不返回。
+    只计算判断信号所需的最后两行：RSI 取最近 period+2 根K线，DIF/DEA 用 macd_tail 一次矩阵乘法得到。
+    """
+    p = {**DEFAULT_PARAMS, **params}
+    arr = closes.to_numpy(dtype=np.float64)
+    compact, _ = kernels.compact_columns(arr)
+    # 压缩后每列的最后两行就是该股票最近两根K线
+    rsi = kernels.rsi(compact[-(p['rsi_period'] + 2):], p['rsi_period'])[-2:]
+    filled, leading = kernels.fill_leading(compact)
+    dif, dea = kernels.macd_tail(filled, p['macd_short'], p['macd_long'], p['macd_signal'])
+    dif[leading[-2:]] = np.nan
+    dea[leading[-2:]] = np.nan
+    # 上市首日两条 EMA 都等于收盘价，DIF 与 DEA 恰好为 0（与逐行递推一致，避免浮点误差误判交叉）
+    padded = np.vstack([np.ones((1, leading.shape[1]), dtype=bool), leading])
+    first_day = (padded[:-1] & ~padded[1:])[-2:]
+    dif[first_day] = 0.0
+    dea[first_day] = 0.0
+    signal, zone, macd = (codes[-1] for codes in signal_codes(rsi, dif, dea))
+
+    valid = ~np.isnan(arr)
+    last_row = len(arr) - 1 - np.argmax(valid[::-1], axis=0)
+    result = pd.DataFrame({
+        'Signal': signal, 'RSI_Zone': zone, 'MACD_Signal': macd,
+        'RSI': rsi[-1], 'DIF': dif[-1], 'DEA': dea[-1],
+        'Date': closes.index[last_row],
+    }, index=closes.columns)
+    result = result[valid.any(axis=0)]
+    return result.sort_values(['Signal', 'RSI'], ascending=[False, True], kind='mergesort')
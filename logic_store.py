@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    BAR_STORE_DIR, FUNDAMENTALS_STORE_DIR, FUNDAMENTALS_FILING_LAG,
+    FUNDAMENTALS_ANNUAL_FILING_LAG, FUNDAMENTALS_RECHECK
+)
+
+
+# 周期由短到长排序，用于判断本地已存的历史是否覆盖请求周期
+PERIOD_ORDER = ('1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'max')
+
+# 周期 -> 回溯时长（'1d' 只取最后一根K线，'max' 不截取）
+PERIOD_OFFSETS = {
+    '5d': pd.DateOffset(days=5),
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+
+# 出现分红/拆股时，复权价格会整体变化，需要全量重拉
+CORPORATE_ACTION_COLS = ('Dividends', 'Stock Splits')
+
+
+def compact_bars(bars):
+    """
+    压缩K线的内存占用（只用于内存中的行情缓存，本地库保持 float64）：价格等数值列用 float32
+    （约7位有效数字，足够展示和计算指标），成交量没有缺失时用 int64，有缺失时保留为 float64（不把缺失当作 0），
+    object 列转为数值。
+    """
+    if bars.empty:
+        return bars
+    dtypes = {}
+    for col, dtype in bars.dtypes.items():
+        if col == 'Volume':
+            if dtype != np.int64:
+                dtypes[col] = np.int64
+        elif dtype != np.float32:
+            dtypes[col] = np.float32
+    if not dtypes:
+        return bars
+    bars = bars.copy()
+    for col, dtype in dtypes.items():
+        values = pd.to_numeric(bars[col], errors='coerce')
+        if dtype is np.int64 and values.isna().any():
+            dtype = np.float64
+        bars[col] = values.astype(dtype)
+    return bars
+
+
+def _symbol_path(symbol, ext, base_dir=BAR_STORE_DIR):
+    """股票代码转为安全文件名（^GSPC、CL=F 等特殊字符统一转义）"""
+    return os.path.join(base_dir, f"{quote(symbol, safe='')}.{ext}")
+
+
+# 每只股票一把锁：K线（Parquet）与元信息（JSON）分两次替换，读写都需要成对进行
+_symbol_locks = {}
+_symbol_locks_guard = threading.Lock()
+
+
+def _symbol_lock(symbol):
+    with _symbol_locks_guard:
+        return _symbol_locks.setdefault(symbol, threading.RLock())
+
+
+def _atomic_write(path, write_fn):
+    """先写临时文件再 os.replace，避免读到写了一半的文件；临时文件名唯一，多线程/多进程同时写互不干扰"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_bars(symbol):
+    """读取本地K线及元信息（覆盖周期、最近拉取时间），不存在或损坏时返回空"""
+    bars_path = _symbol_path(symbol, 'parquet')
+    meta_path = _symbol_path(symbol, 'json')
+    with _symbol_lock(symbol):
+        if not (os.path.exists(bars_path) and os.path.exists(meta_path)):
+            return pd.DataFrame(), {}
+        try:
+            bars = pd.read_parquet(bars_path)
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except Exception:
+            return pd.DataFrame(), {}
+    if isinstance(bars.index, pd.DatetimeIndex) and bars.index.tz is not None:
+        # 早期版本按交易所时区存储，统一转为不带时区的日期
+        bars.index = bars.index.tz_localize(None)
+    return bars, meta
+
+
+def save_bars(symbol, bars, period):
+    """整体写回某只股票的K线（Parquet，保持原始精度）与元信息（JSON），返回写入的K线"""
+    meta = {'period': period, 'updated': time.time(), 'rows': len(bars)}
+
+    def _write_meta(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    with _symbol_lock(symbol):
+        _atomic_write(_symbol_path(symbol, 'parquet'), bars.to_parquet)
+        _atomic_write(_symbol_path(symbol, 'json'), _write_meta)
+    return bars
+
+
+def slice_period(bars, period):
+    """从完整历史中截取某个周期的数据（以最后一根K线为基准回溯）"""
+    if bars.empty or period == 'max':
+        return bars
+    if period == '1d':
+        return bars.iloc[-1:]
+    if period not in PERIOD_OFFSETS:
+        return bars  # 非标准周期不截取
+    start = bars.index[-1] - PERIOD_OFFSETS[period]
+    return bars.iloc[bars.index.searchsorted(start):]
+
+
+def period_covers(stored_period, period):
+    """已有周期是否覆盖请求周期（非标准周期一律视为不覆盖）"""
+    if stored_period not in PERIOD_ORDER or period not in PERIOD_ORDER:
+        return False
+    return PERIOD_ORDER.index(stored_period) >= PERIOD_ORDER.index(period)
+
+
+def _has_corporate_action(bars):
+    for col in CORPORATE_ACTION_COLS:
+        if col in bars.columns and (bars[col].fillna(0) != 0).any():
+            return True
+    return False
+
+
+def refresh_bars(symbol, period, fetch, max_age=0):
+    """
+    增量刷新本地K线：本地已有且覆盖请求周期时，只拉取最后一根K线之后的数据并追加；
+    否则按请求周期全量拉取后落盘。返回 (本地完整K线, 覆盖周期)，覆盖周期可能比请求周期更长。
+    本地数据在 max_age 秒内刚刷新过（可能是其他进程刷新的）时直接返回，不访问上游。
+    fetch(period=..., start=...) 由调用方提供（如数据源的 history）。
+    """
+    if period not in PERIOD_ORDER:
+        # 非标准周期不走本地库
+        return fetch(period=period), period
+
+    bars, meta = load_bars(symbol)
+    stored_period = meta.get('period')
+
+    if bars.empty or not period_covers(stored_period, period):
+        fresh = fetch(period=period)
+        if fresh.empty:
+            return bars, stored_period
+        # 已有更短历史时以新数据为准合并（新数据覆盖重叠部分）
+        merged = pd.concat([bars, fresh]) if not bars.empty else fresh
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        return save_bars(symbol, merged, period), period
+
+    if time.time() - meta.get('updated', 0) < max_age:
+        return bars, stored_period
+
+    # 从最后一根K线当天开始拉取：当天未收盘的K线也会被新值覆盖
+    last_ts = bars.index[-1]
+    increment = fetch(start=last_ts.strftime('%Y-%m-%d'))
+    if increment.empty:
+        return bars, stored_period
+
+    new_rows = increment[increment.index > last_ts]
+    if _has_corporate_action(new_rows):
+        # 复权因子变化，旧的复权价格已失效，按已存周期全量重拉
+        fresh = fetch(period=stored_period)
+        if not fresh.empty:
+            return save_bars(symbol, fresh, stored_period), stored_period
+
+    merged = pd.concat([bars, increment])
+    merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+    return save_bars(symbol, merged, stored_period), stored_period
+
+
+def get_bars(symbol, period, fetch):
+    """增量获取某个周期的K线（见 refresh_bars）"""
+    bars, _ = refresh_bars(symbol, period, fetch)
+    return slice_period(bars, period)
+
+
+def _latest_report(statements):
+    """最新报告期及其是否来自季报（优先季报；没有任何报表时返回 (None, False)）"""
+    for freq in ('quarterly', 'annual'):
+        periods = [pd.to_datetime(df.columns, errors='coerce').max()
+                   for (_, f), df in statements.items() if f == freq and not df.empty]
+        periods = [p for p in periods if pd.notna(p)]
+        if periods:
+            return max(periods), freq == 'quarterly'
+    return None, False
+
+
+def next_report_due(latest_period, quarterly=True):
+    """下一期报表的预计披露日：报告期结束 + 一个季度（或一年）+ 披露滞后"""
+    if quarterly:
+        return latest_period + pd.DateOffset(months=3) + pd.Timedelta(days=FUNDAMENTALS_FILING_LAG)
+    return latest_period + pd.DateOffset(years=1) + pd.Timedelta(days=FUNDAMENTALS_ANNUAL_FILING_LAG)
+
+
+def load_fundamentals(symbol):
+    """读取本地财报 {(报表, 频率): DataFrame} 及元信息，不存在或损坏时返回空"""
+    path = _symbol_path(symbol, 'pkl', FUNDAMENTALS_STORE_DIR)
+    if not os.path.exists(path):
+        return {}, {}
+    try:
+        payload = pd.read_pickle(path)
+        return payload['statements'], payload['meta']
+    except Exception:
+        return {}, {}
+
+
+def save_fundamentals(symbol, statements):
+    """整体写回某只股票的财报，元信息记录最新报告期与预计下次披露日，返回元信息"""
+    latest, quarterly = _latest_report(statements)
+    meta = {
+        'fetched_at': time.time(),
+        'latest_period': latest.isoformat() if latest is not None else None,
+        'next_due': next_report_due(latest, quarterly).isoformat() if latest is not None else None,
+    }
+    payload = {'statements': statements, 'meta': meta}
+    _atomic_write(_symbol_path(symbol, 'pkl', FUNDAMENTALS_STORE_DIR),
+                  lambda path: pd.to_pickle(payload, path))
+    return meta
+
+
+def fundamentals_expired(meta, most_recent_quarter=None, now=None):
+    """
+    财报是否需要重新拉取：已过预计披露日、公司信息中的最近季度（mostRecentQuarter，秒级时间戳）
+    比本地最新报告期更新、或本地没有任何报表时失效；上游尚未更新时按 FUNDAMENTALS_RECHECK 间隔重试。
+    """
+    if not meta:
+        return True
+    now = time.time() if now is None else now
+    if now - meta.get('fetched_at', 0) < FUNDAMENTALS_RECHECK:
+        return False
+    latest, next_due = meta.get('latest_period'), meta.get('next_due')
+    if latest is None:
+        return True
+    if most_recent_quarter and pd.Timestamp(most_recent_quarter, unit='s').normalize() > pd.Timestamp(latest):
+        return True
+    return pd.Timestamp(now, unit='s') >= pd.Timestamp(next_due)
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from config import BACKTEST_PROCESSES
+from logic_backtest import POSITIONS, SWEEP_HIGHS, SWEEP_LOWS, grid_metrics, simple_returns
+from logic_batch import get_pool
+from logic_calc import IndicatorPipeline
+
+
+WALK_FORWARD_MODES = ('rolling', 'expanding')
+
+# 每个窗口的结果表的列：键 -> 展示名称
+WINDOW_COLUMNS = {
+    'train_start': '训练开始',
+    'test_start': '测试开始',
+    'test_end': '测试结束',
+    'low': '买入阈值',
+    'high': '卖出阈值',
+    'train_score': '训练期得分',
+    'final': '测试期收益率',
+    'buy_hold': '测试期买入持有',
+    'sharpe': '测试期夏普',
+    'max_dd': '测试期最大回撤',
+}
+
+
+def walk_forward_windows(n, train, test, mode='rolling'):
+    """
+    把 n 根K线切成首尾相接的 训练/测试 窗口，返回 [(训练开始, 测试开始, 测试结束)]（左闭右开）。
+    rolling：训练期固定为 train 根K线；expanding：训练期始终从第一根K线开始。
+    测试期依次相接，最后一个测试期可能不足 test 根。
+    """
+    if mode not in WALK_FORWARD_MODES:
+        raise ValueError(f"未知的窗口模式：{mode}")
+    windows = []
+    for split in range(train, n, test):
+        start = 0 if mode == 'expanding' else split - train
+        windows.append((start, split, min(split + test, n)))
+    return windows
+
+
+def optimise_window(close, split, strategy, metric='sharpe', lows=SWEEP_LOWS, highs=SWEEP_HIGHS):
+    """
+    一个窗口（close 为 训练期+测试期 的收盘价，前 split 根为训练期）：
+    指标在整个窗口上只计算一次，训练期用全部阈值组合的 metric 选出最优参数，再在测试期回测这组参数。
+    指标只依赖过去的价格，测试期的持仓不会用到未来数据；测试期第一天的收益按训练期最后一天的持仓计算。
+    """
+    pipeline = IndicatorPipeline(close)
+    indicators = {name: pipeline.get(name) for name in ('RSI', 'DIF', 'DEA')}
+    positions = POSITIONS[strategy](indicators, lows, highs).reshape(len(close), -1)
+    returns = simple_returns(close)
+
+    scores = grid_metrics(returns[:split], positions[:split])[metric]
+    # 所有指标都是越大越好（最大回撤为负数）；训练期无法评分时用各自阈值范围的中点
+    best = np.nanargmax(scores) if not np.isnan(scores).all() else \
+        np.ravel_multi_index((len(lows) // 2, len(highs) // 2), (len(lows), len(highs)))
+    i, j = np.unravel_index(best, (len(lows), len(highs)))
+
+    # 策略与买入持有（始终满仓）两列一起计算测试期指标
+    test_positions = np.column_stack([positions[split - 1:, best], np.ones(len(close) - split + 1)])
+    test = grid_metrics(returns[split - 1:], test_positions)
+    strategy_returns = returns[split:] * positions[split - 1:-1, best]
+    return {
+        'low': int(lows[i]),
+        'high': int(highs[j]),
+        'train_score': float(scores[best]),
+        'final': test['final'][0],
+        'buy_hold': test['final'][1],
+        'sharpe': test['sharpe'][0],
+        'max_dd': test['max_dd'][0],
+        'returns': strategy_returns,
+    }
+
+
+def walk_forward(close, strategy, train, test, mode='rolling', metric='sharpe',
+                 lows=SWEEP_LOWS, highs=SWEEP_HIGHS, processes=BACKTEST_PROCESSES):
+    """
+    滚动优化（walk-forward）：close 为收盘价 Series，各窗口互不依赖，多进程时并行计算。
+    返回 (每个窗口的参数与样本外指标表, 拼接后的样本外净值 DataFrame[Equity_Strategy, Equity_BuyHold])。
+    """
+    close = close.dropna()
+    values = close.to_numpy(dtype=np.float64)
+    windows = walk_forward_windows(len(values), train, test, mode)
+    jobs = [(values[start:stop], split - start, strategy, metric, lows, highs)
+            for start, split, stop in windows]
+    if processes <= 1 or len(jobs) <= 1:
+        results = [optimise_window(*job) for job in jobs]
+    else:
+        pool = get_pool(processes)
+        results = [future.result() for future in [pool.submit(optimise_window, *job) for job in jobs]]
+
+    rows = []
+    for (start, split, stop), result in zip(windows, results):
+        rows.append({
+            'train_start': close.index[start],
+            'test_start': close.index[split],
+            'test_end': close.index[stop - 1],
+            **{key: value for key, value in result.items() if key != 'returns'},
+        })
+    table = pd.DataFrame(rows, columns=list(WINDOW_COLUMNS))
+
+    if not windows:
+        return table, pd.DataFrame(columns=['Equity_Strategy', 'Equity_BuyHold'], dtype=np.float64)
+    # 测试期首尾相接，拼起来就是完整的样本外区间
+    first_test = windows[0][1]
+    oos_returns = np.concatenate([result['returns'] for result in results])
+    equity = pd.DataFrame({
+        'Equity_Strategy': np.cumprod(1.0 + oos_returns),
+        'Equity_BuyHold': values[first_test:] / values[first_test - 1],
+    }, index=close.index[first_test:])
+    return table, equity
+
+
+def parameter_stability(table):
+    """各窗口最优参数的稳定性：阈值的标准差，以及与上一窗口参数相同的比例"""
+    if table.empty:
+        return {'low_std': np.nan, 'high_std': np.nan, 'unchanged': np.nan}
+    params = table[['low', 'high']].to_numpy()
+    unchanged = (params[1:] == params[:-1]).all(axis=1).mean() if len(params) > 1 else np.nan
+    return {
+        'low_std': float(table['low'].std(ddof=0)),
+        'high_std': float(table['high'].std(ddof=0)),
+        'unchanged': float(unchanged),
+    }
@@ -1,15 +1,19 @@
 import streamlit as st
+from datetime import datetime
 from config import (
     PAGE_LAYOUT, PAGE_TITLE, DEFAULT_TICKER, PERIOD_OPTIONS,
     DEFAULT_PERIOD_INDEX, SIDEBAR_INFO, PRESET_STOCKS, DEFAULT_PERIOD
 )
 
-from logic_data import get_data
+from logic_data import get_indicator_frame, get_info, get_data_status
 from stock_comparison import show_stock_comparison
 from watchlist import show_watchlist
 from backtest import show_backtest
-from logic_calc import calc_price_metrics, calc_sma_50, calc_RSI, calc_MACD
+from logic_calc import calc_price_metrics
 from logic_plot import plot_sma50, plot_rsi, plot_macd
+from logic_signal import get_investment_signal
+from logic_cache import get_cache_stats
+from logic_prefetch import start_prefetch, get_prefetch_stats
 
 
 # ========== 全局页面基础设置 & UI 主题美化 ==========
@@ -156,6 +160,9 @@ st.markdown(
 )
 
 
+# 后台预取线程（进程内只启动一次），让常用股票的请求命中已预热的缓存
+start_prefetch()
+
 if 'current_indicator' not in st.session_state:
     st.session_state.current_indicator = "SMA50"
 
@@ -263,6 +270,17 @@ with tab1:
 
             st.info(SIDEBAR_INFO)
 
+        with st.expander("⚙️ 数据缓存状态"):
+            prefetch_stats = get_prefetch_stats()
+            warm_ratio = prefetch_stats["warm_hit"]["ratio"]
+            st.caption(f"预热命中率：{warm_ratio:.0%}" if warm_ratio is not None else "预热命中率：暂无请求")
+            st.caption(f"后台预取：已刷新 {prefetch_stats.get('refreshed', 0)} 次，"
+                       f"完成 {prefetch_stats.get('cycles', 0)} 轮")
+            cache_stats = get_cache_stats()
+            st.caption(f"内存缓存：{cache_stats['total_bytes'] / 2**20:.1f} / "
+                       f"{cache_stats['max_bytes'] / 2**20:.0f} MB，{cache_stats['entries']} 条，"
+                       f"已淘汰 {cache_stats['evictions']} 条")
+
 
     st.session_state.ticker_symbol = ticker_symbol  # 覆盖旧值
     st.session_state.ticker_period = ticker_period
@@ -274,19 +292,16 @@ with tab1:
         st.session_state.ticker_period = ticker_period
 
 
-    df, info, news = get_data(st.session_state.ticker_symbol,st.session_state.ticker_period)
+    # K线与全部技术指标一次算好并按数据版本缓存，指标卡、信号判断与下方图表共用（只读）
+    df = get_indicator_frame(st.session_state.ticker_symbol, st.session_state.ticker_period)
+    info = get_info(st.session_state.ticker_symbol)  # 与周期无关，切换周期不会重新请求
 
     # 初始化信号变量（防止未定义错误）
     signal_icon = "❓"
     status = "无数据"
     signal_reason = "无法获取股票数据"
 
-    # 先统一计算技术指标，供上方指标卡与下方图表复用
     if not df.empty:
-        df = calc_sma_50(df)
-        df = calc_RSI(df)
-        df = calc_MACD(df)
-
         # ========== 新增：调用信号判断函数（此时df有所有指标数据） ==========
         signal_icon, status, signal_reason = get_investment_signal(df)
 
@@ -306,6 +321,14 @@ with tab1:
         else:
             macd_signal_text = "无明显信号"
 
+        # 数据新鲜度：缓存过期时先展示旧数据，后台刷新完成后下次渲染即为最新
+        data_status = get_data_status(ticker_symbol)
+        freshness = None
+        if data_status is not None:
+            freshness = f"数据更新于 {datetime.fromtimestamp(data_status['updated_at']):%Y-%m-%d %H:%M}"
+            if data_status["stale"]:
+                freshness += "（已过期，后台刷新中）" if data_status["refreshing"] else "（已过期）"
+
         # 使用 st.columns 做成一行指标卡
         col_price, col_rsi, col_macd = st.columns(3)
         with col_price:
@@ -315,19 +338,24 @@ with tab1:
                 label="当前价格（Close）",
                 value=f"{current_price:.2f}",
                 delta=delta_str,
-                delta_color="normal"
+                delta_color="normal",
+                help=freshness
             )
         with col_rsi:
             rsi_value_display = f"{latest_rsi:.2f}" if latest_rsi is not None else "N/A"
             st.metric(
                 label="RSI（相对强弱指标）",
-                value=rsi_value_display
+                value=rsi_value_display,
+                help=freshness
             )
         with col_macd:
             st.metric(
                 label="MACD 信号",
-                value=macd_signal_text
+                value=macd_signal_text,
+                help=freshness
             )
+        if freshness:
+            st.caption(f"{'⏳' if data_status['stale'] else '🕒'} {freshness}")
 
 
 
@@ -357,18 +385,9 @@ with tab1:
             st.rerun()
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # ========== 计算对应指标并绘图 ==========
+    # ========== 绘制对应指标图表（指标已在上方算好，切换时不再重算） ==========
     if not df.empty:
-        # 根据当前指标计算对应数据
         current_ind = st.session_state.current_indicator
-        if current_ind == "SMA50":
-            df = calc_sma_50(df)
-        elif current_ind == "RSI":
-            df = calc_RSI(df)
-        elif current_ind == "MACD":
-            df = calc_MACD(df)
-        
-        # 绘制对应指标图表
         if current_ind == "SMA50":
             fig = plot_sma50(df)
         elif current_ind == "RSI":
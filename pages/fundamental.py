@@ -8,7 +8,7 @@ from config import (
     PAGE_TITLE,   # 页面标题配置
     CACHE_TTL     # 缓存时间（可用于扩展）
 )
-from logic_data import get_data, get_balance_sheet
+from logic_data import get_info, get_fundamentals, get_fundamentals_status
 
 # ========== 页面基础设置（使用config中的标准化配置） ==========
 st.set_page_config(
@@ -57,7 +57,9 @@ if 'ticker_symbol' not in st.session_state:
 ticker_symbol = st.session_state.ticker_symbol
 
 # ========== 拉取基本面数据 ==========
-_, info, _ = get_data(ticker_symbol, "")  # 周期不影响基本面，传空即可
+info = get_info(ticker_symbol)  # 只拉公司信息，不再附带下载K线和新闻
+# 三张报表（年度+季度）来自本地财报库，有新报告期时才重新拉取
+statements = get_fundamentals(ticker_symbol, info)
 
 # ========== 顶部公司概览卡片 ==========
 short_name = info.get("shortName", ticker_symbol)
@@ -112,7 +114,7 @@ with col_f1:
 
 with col_f2:
     st.subheader("资产负债表 (最新)")
-    balance_sheet = get_balance_sheet(ticker_symbol)
+    balance_sheet = statements.get(("balance_sheet", "annual"), pd.DataFrame())
     if not balance_sheet.empty:
         # 展示前10行，保留2位小数
         st.dataframe(
@@ -124,6 +126,27 @@ with col_f2:
 
 st.markdown("---")
 
+# ========== 完整财务报表（年度/季度） ==========
+st.subheader("财务报表")
+freq_label = st.radio("报表频率", options=["年度", "季度"], horizontal=True, key="statement_freq")
+freq = "annual" if freq_label == "年度" else "quarterly"
+fundamentals_status = get_fundamentals_status(ticker_symbol)
+if fundamentals_status and fundamentals_status.get("latest_period"):
+    st.caption(f"最新报告期：{fundamentals_status['latest_period'][:10]}，"
+               f"预计下次披露：{fundamentals_status['next_due'][:10]}")
+statement_tabs = st.tabs(["资产负债表", "利润表", "现金流量表"])
+for tab, kind in zip(statement_tabs, ("balance_sheet", "income_stmt", "cashflow")):
+    with tab:
+        statement = statements.get((kind, freq), pd.DataFrame())
+        if not statement.empty:
+            # 列名为报告期，只显示日期
+            statement = statement.rename(columns=lambda c: c.strftime("%Y-%m-%d") if hasattr(c, "strftime") else c)
+            st.dataframe(statement.round(2), use_container_width=True)
+        else:
+            st.info("暂无该报表数据")
+
+st.markdown("---")
+
 # ========== 补充：公司关键信息速览 ==========
 st.subheader("公司关键信息速览")
 info_col1, info_col2, info_col3 = st.columns(3)
@@ -3,7 +3,7 @@ from datetime import datetime
 from config import (
     MAX_NEWS_DISPLAY, NEWS_COL_RATIO, THUMBNAIL_WIDTH
 )
-from logic_data import get_data
+from logic_data import get_history, get_info, get_news
 
 # ========== 页面基础设置 ==========
 st.set_page_config(layout="wide", page_title="股票新闻 | Stock Dashboard")
@@ -51,7 +51,9 @@ ticker_symbol = st.session_state.ticker_symbol
 ticker_period = st.session_state.ticker_period
 
 # ========== 拉取新闻及基础行情数据 ==========
-df, info, news = get_data(ticker_symbol, ticker_period)
+df = get_history(ticker_symbol, ticker_period)
+info = get_info(ticker_symbol)
+news = get_news(ticker_symbol)
 
 # ========== 顶部股票信息概览 ==========
 short_name = info.get("shortName", ticker_symbol)
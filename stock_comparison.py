@@ -1,9 +1,9 @@
 # stock_comparison.py - 独立的收益率对比功能模块
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import plotly.graph_objects as go
 from config import PRESET_STOCKS, BENCHMARK_OPTIONS
+from logic_data import get_history
 # 复用主配置的股票列表（也可单独定义）
 
 
@@ -65,14 +65,16 @@ def show_stock_comparison():
                 horizontal=True
             )
 
-    # 2. 数据获取与收益率计算（带缓存）
-    @st.cache_data(ttl=3600)  # 缓存1小时，避免重复请求
+    # 2. 数据获取与收益率计算（K线来自共享缓存，收益率现算，不再单独缓存一份）
     def get_stock_returns(ticker, period, return_type):
         """获取股票收益率数据"""
         try:
             # 下载调整后收盘价（考虑分红/拆股）
-            df = yf.download(ticker, period=period,
-                             progress=False)["Close"]
+            # 来自共享K线缓存，较短周期直接切片较长的已缓存历史
+            hist = get_history(ticker, period)
+            if hist.empty:
+                return None
+            df = hist["Close"]
             if return_type == "累计收益率":
                 # 累计收益率 = (当前价/初始价 - 1) * 100
                 returns = (df / df.iloc[0] - 1) * 100
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from logic_cache import ByteBudget, SWRCache, measure_bytes
+
+
+def test_measure_bytes_sums_containers_of_arrays():
+    arrays = {"Close": np.zeros(100), "Index": pd.date_range("2024-01-01", periods=100)}
+    assert measure_bytes(arrays) >= 100 * 8 * 2
+    frames = {("balance_sheet", "annual"): pd.DataFrame({"a": np.zeros(50)})}
+    assert measure_bytes(frames) >= 50 * 8
+    assert measure_bytes((np.zeros(10), np.zeros(10))) == 160
+
+
+def test_record_counts_lookups_served_by_peek():
+    cache = SWRCache("test", float("inf"), swr=False, budget=ByteBudget(1 << 20))
+    cache.record("misses")
+    cache.put("k", np.zeros(4))
+    assert cache.peek("k") is not None
+    cache.record("hits")
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
@@ -0,0 +1,130 @@
+import pytest
+
+from logic_ratelimit import CircuitBreaker, TokenBucket, UpstreamLimiter, UpstreamUnavailable
+
+
+class FakeClock:
+    """可手动拨动的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeProvider:
+    """本地假上游：按顺序返回预设结果，异常实例会被抛出；记录实际被调用的次数"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        response = self.responses.pop(0) if self.responses else "ok"
+        if isinstance(response, BaseException):
+            raise response
+        return response
+
+
+RATE_LIMITED = Exception("429 Too Many Requests")
+
+
+def make_limiter(clock, rate=1.0, burst=3, threshold=2, cooldown=60):
+    return UpstreamLimiter(TokenBucket(rate, burst, clock=clock),
+                           CircuitBreaker(threshold, cooldown, clock=clock))
+
+
+def test_token_budget_limits_upstream_calls():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rate=1.0, burst=3)
+    provider = FakeProvider()
+
+    assert [limiter.call("AAPL", provider.fetch) for _ in range(3)] == ["ok"] * 3
+    # 令牌耗尽后回退到最近一次成功结果，不再访问上游
+    assert limiter.call("AAPL", provider.fetch) == "ok"
+    assert provider.calls == 3
+    assert limiter.stats["throttled"] == 1
+    with pytest.raises(UpstreamUnavailable):
+        limiter.call("MSFT", provider.fetch)
+
+    clock.advance(1.0)  # 补充一个令牌
+    limiter.call("AAPL", provider.fetch)
+    assert provider.calls == 4
+
+
+def test_breaker_opens_after_repeated_429_and_serves_last_good():
+    clock = FakeClock()
+    limiter = make_limiter(clock, burst=10, threshold=2)
+    provider = FakeProvider("v1", RATE_LIMITED, RATE_LIMITED)
+
+    assert limiter.call("AAPL", provider.fetch) == "v1"
+    assert limiter.call("AAPL", provider.fetch) == "v1"
+    assert limiter.breaker.state == "closed"
+    assert limiter.call("AAPL", provider.fetch) == "v1"
+    assert limiter.breaker.state == "open"
+
+    # 熔断打开期间不访问上游，只返回最近一次成功结果
+    assert limiter.call("AAPL", provider.fetch) == "v1"
+    assert provider.calls == 3
+    assert limiter.stats["short_circuited"] == 1
+    with pytest.raises(UpstreamUnavailable):
+        limiter.call("MSFT", provider.fetch)
+
+
+def test_half_open_probe_recovers_or_reopens():
+    clock = FakeClock()
+    limiter = make_limiter(clock, burst=10, threshold=2, cooldown=60)
+    provider = FakeProvider("v1", RATE_LIMITED, RATE_LIMITED, RATE_LIMITED, "v2")
+    for _ in range(3):
+        limiter.call("AAPL", provider.fetch)
+    assert limiter.breaker.state == "open"
+
+    clock.advance(60)
+    assert limiter.breaker.state == "half-open"
+    # 试探请求仍被限流：重新打开，再等一个冷却期
+    assert limiter.call("AAPL", provider.fetch) == "v1"
+    assert limiter.breaker.state == "open"
+
+    clock.advance(60)
+    assert limiter.call("AAPL", provider.fetch) == "v2"
+    assert limiter.breaker.state == "closed"
+    assert provider.calls == 5
+
+
+def test_throttled_probe_does_not_leave_breaker_stuck():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rate=0.001, burst=3, threshold=2, cooldown=60)
+    provider = FakeProvider("v1", RATE_LIMITED, RATE_LIMITED)
+    for _ in range(3):  # 用完全部令牌，并让熔断打开
+        limiter.call("AAPL", provider.fetch)
+    assert limiter.breaker.state == "open"
+
+    clock.advance(60)  # 半开，但令牌仍不足：试探请求被限速
+    assert limiter.call("AAPL", provider.fetch) == "v1"
+    assert limiter.stats["throttled"] == 1
+
+    for wait in (60, 600, 6000):
+        clock.advance(wait)
+        if limiter.bucket.tokens >= 1:
+            break
+    assert limiter.call("AAPL", provider.fetch) == "ok"
+    assert limiter.breaker.state == "closed"
+
+
+def test_interrupted_probe_is_released():
+    clock = FakeClock()
+    limiter = make_limiter(clock, burst=10, threshold=1, cooldown=60)
+    provider = FakeProvider(RATE_LIMITED, KeyboardInterrupt())
+    with pytest.raises(UpstreamUnavailable):
+        limiter.call("AAPL", provider.fetch)
+
+    clock.advance(60)
+    with pytest.raises(KeyboardInterrupt):
+        limiter.call("AAPL", provider.fetch)
+    assert limiter.call("AAPL", provider.fetch) == "ok"
+    assert limiter.breaker.state == "closed"
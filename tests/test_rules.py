@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from logic_rules import RuleError, compile_rules, evaluate_rule
+
+
+@pytest.fixture
+def bars():
+    close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 120))
+    return pd.DataFrame({"Close": close}, index=pd.date_range("2024-01-01", periods=len(close)))
+
+
+def test_constant_operand_combined_with_series(bars):
+    position = evaluate_rule("RSI < 30 or 1 < 2", bars)
+    assert position.shape == (len(bars),)
+    assert position.all()
+    assert not evaluate_rule("RSI < 30 and 2 < 1", bars).any()
+
+
+def test_constant_only_rules_return_full_length(bars):
+    assert evaluate_rule("1 < 2", bars).shape == (len(bars),)
+    cross = evaluate_rule("CROSS_UP(1, 2)", bars)
+    assert cross.shape == (len(bars),) and not cross.any()
+    values = compile_rules({"x": "-1.5", "y": "CLOSE * 2"}).evaluate(bars)
+    assert np.array_equal(values["x"], np.full(len(bars), -1.5))
+    assert np.allclose(values["y"], bars["Close"].to_numpy() * 2)
+
+
+def test_evaluation_errors_are_rule_errors(bars):
+    with pytest.raises(RuleError):
+        evaluate_rule("HIGH > CLOSE", bars)
+    with pytest.raises(RuleError):
+        evaluate_rule("CLOSE > 1", pd.DataFrame({"Close": ["a", "b"]}))
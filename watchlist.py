@@ -1,47 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 
-from config import WATCHLIST, DEFAULT_PERIOD
+from config import WATCHLIST, DEFAULT_PERIOD, WATCHLIST_MAX_WORKERS, WATCHLIST_CACHE_TTL
+import logic_kernels as kernels
+from logic_cache import SWRCache
+from logic_data import fetch_upstream
+from logic_provider import get_provider
+
+
+# 自选股指标表（按 代码列表+周期），与行情缓存共用内存预算
+_watchlist_cache = SWRCache("watchlist", WATCHLIST_CACHE_TTL)
+
+
+def _download_one(symbol, period):
+    try:
+        df = fetch_upstream(("history", symbol, period),
+                            lambda: get_provider().history(symbol, period=period),
+                            ttl=WATCHLIST_CACHE_TTL)
+    except Exception:
+        return None
+    if df.empty:
+        return None
+    return df["Close"]
+
+
+def download_closes(symbols, period):
+    """
+    拉取多只股票的收盘价，返回 日期×代码 对齐的宽表（各市场休市日为 NaN）。
+    优先一次批量下载；批量失败或缺失的代码再用有限大小的线程池并发补齐。
+    """
+    symbols = list(dict.fromkeys(symbols))
+    closes = pd.DataFrame()
+    try:
+        closes = fetch_upstream(("closes", tuple(symbols), period),
+                                lambda: get_provider().closes(symbols, period),
+                                ttl=WATCHLIST_CACHE_TTL)
+    except Exception:
+        pass
+
+    missing = [s for s in symbols if s not in closes.columns or closes[s].dropna().empty]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(WATCHLIST_MAX_WORKERS, len(missing))) as pool:
+            fetched = dict(zip(missing, pool.map(lambda s: _download_one(s, period), missing)))
+        fetched = {s: c for s, c in fetched.items() if c is not None}
+        if fetched:
+            closes = pd.concat([closes.drop(columns=list(fetched), errors="ignore"),
+                                pd.DataFrame(fetched)], axis=1)
+
+    return closes.reindex(columns=[s for s in symbols if s in closes.columns]).sort_index()
+
+
+def calc_latest_metrics(closes, rsi_period=14):
+    """
+    对收盘价宽表按列向量化计算最新价、涨跌额、涨跌幅与RSI。
+    每列的有效值先下沉到底部，各股票按自己的交易日序列计算，不受其他市场休市日影响。
+    """
+    valid = closes.notna().to_numpy()
+    compact, _ = kernels.compact_columns(closes.to_numpy(dtype=float))
+
+    close = compact[-1]
+    prev_close = compact[-2]
+    delta = close - prev_close
+    delta_pct = delta / prev_close * 100
+
+    # 简单 RSI 计算（14期），与主页面共用 logic_kernels（二维按列计算）
+    rsi = kernels.rsi(compact, rsi_period)[-1]
+
+    metrics = pd.DataFrame({
+        "代码": closes.columns,
+        "最新价": close.round(2),
+        "涨跌额": delta.round(2),
+        "涨跌幅(%)": delta_pct.round(2),
+        "RSI": rsi.round(1),
+    })
+    # 有效数据不足2行的股票无法计算涨跌，直接剔除
+    metrics = metrics[valid.sum(axis=0) >= 2].reset_index(drop=True)
+    metrics["RSI"] = metrics["RSI"].astype(object).where(metrics["RSI"].notna(), None)
+    return metrics
+
+
+def _load_watchlist_data(symbols, period):
+    closes = download_closes(symbols, period)
+    if closes.empty or len(closes) < 2:
+        return pd.DataFrame()
+    return calc_latest_metrics(closes)
 
 
-@st.cache_data(ttl=1800)
 def fetch_watchlist_data(symbols, period):
     """批量拉取自选股价格与简单技术指标（收盘价、涨跌幅、RSI）。"""
-    data_rows = []
-    for symbol in symbols:
-        try:
-            df = yf.download(symbol, period=period, progress=False)
-            if df.empty or len(df) < 2:
-                continue
-            close = df["Close"].iloc[-1]
-            prev_close = df["Close"].iloc[-2]
-            delta = close - prev_close
-            delta_pct = delta / prev_close * 100
-
-            # 简单 RSI 计算（14期）
-            price_change = df["Close"].diff().dropna()
-            gain = price_change.where(price_change > 0, 0).rolling(14).mean()
-            loss = (-price_change.where(price_change < 0, 0)).rolling(14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            latest_rsi = float(rsi.iloc[-1]) if not rsi.dropna().empty else None
-
-            data_rows.append(
-                {
-                    "代码": symbol,
-                    "最新价": round(close, 2),
-                    "涨跌额": round(delta, 2),
-                    "涨跌幅(%)": round(delta_pct, 2),
-                    "RSI": round(latest_rsi, 1) if latest_rsi is not None else None,
-                }
-            )
-        except Exception:
-            continue
-
-    if not data_rows:
-        return pd.DataFrame()
-    return pd.DataFrame(data_rows)
+    symbols = tuple(symbols)
+    # 返回副本，调用方追加列不影响缓存
+    return _watchlist_cache.get((symbols, period), lambda: _load_watchlist_data(symbols, period)).copy()
 
 
 def show_watchlist():